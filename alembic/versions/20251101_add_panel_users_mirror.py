@@ -0,0 +1,35 @@
+"""add panel_users mirror table
+
+Revision ID: 20251101_panel_users
+Revises: 20251025_user_info
+Create Date: 2025-11-01 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20251101_panel_users'
+down_revision = '20251025_user_info'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'panel_users',
+        sa.Column('username', sa.String(255), primary_key=True),
+        sa.Column('status', sa.String(32), nullable=False),
+        sa.Column('expire', sa.BigInteger(), nullable=True),
+        sa.Column('data_limit', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('used_traffic', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('online_at', sa.String(64), nullable=True),
+        sa.Column('subscription_url', sa.Text(), nullable=True),
+        sa.Column('row_hash', sa.String(32), nullable=False),
+        sa.Column('synced_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_panel_users_status', 'panel_users', ['status'])
+    op.create_index('ix_panel_users_expire', 'panel_users', ['expire'])
+
+def downgrade():
+    op.drop_index('ix_panel_users_expire', table_name='panel_users')
+    op.drop_index('ix_panel_users_status', table_name='panel_users')
+    op.drop_table('panel_users')
@@ -0,0 +1,33 @@
+"""add broadcast_recipients and resumable broadcast columns
+
+Revision ID: 20251108_bcast_recipients
+Revises: 20251101_panel_users
+Create Date: 2025-11-08 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20251108_bcast_recipients'
+down_revision = '20251101_panel_users'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('broadcasts', sa.Column('kind', sa.String(16), nullable=False, server_default='builder'))
+    op.add_column('broadcasts', sa.Column('status', sa.String(16), nullable=False, server_default='completed'))
+    op.add_column('broadcasts', sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table(
+        'broadcast_recipients',
+        sa.Column('broadcast_id', sa.Integer(), sa.ForeignKey('broadcasts.broadcast_id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column('status', sa.String(16), nullable=False, server_default='pending'),
+    )
+    op.create_index('ix_broadcast_recipients_status', 'broadcast_recipients', ['broadcast_id', 'status'])
+
+def downgrade():
+    op.drop_index('ix_broadcast_recipients_status', table_name='broadcast_recipients')
+    op.drop_table('broadcast_recipients')
+    op.drop_column('broadcasts', 'total_count')
+    op.drop_column('broadcasts', 'status')
+    op.drop_column('broadcasts', 'kind')
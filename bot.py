@@ -4,14 +4,22 @@ import logging.handlers
 import sys
 import os
 import asyncio
+import atexit
+import copy
+import json
+import queue
 from modules.broadcaster import handler as broadcaster_handler
+from modules.broadcaster.actions.resume import resume_unfinished_broadcasts
 from modules.reminder.actions.jobs import cleanup_expired_test_accounts
+from modules.marzban.actions.panel_mirror import sync_panel_users_job
 from modules.financials import handler as financials_handler
 from modules.payment import handler as payment_handler
 from modules.user_info import handler as user_info_handler
-from database.crud import user as crud_user
 
-from shared.translator import init_translator
+from shared.translator import init_translator, watch_translations_job
+from shared.activity import record_activity, flush_activity, flush_activity_job
+from shared.handler_registry import register_modules
+from shared.update_trace import start_update_trace, stop_update_trace, load_trace_setting, trace_update
 
 
 init_translator()
@@ -19,7 +27,7 @@ init_translator()
 import argparse
 
 from telegram import Update
-from telegram.ext import Application, ApplicationBuilder, ContextTypes, MessageHandler, CallbackQueryHandler, filters,TypeHandler
+from telegram.ext import Application, ApplicationBuilder, ContextTypes, TypeHandler
 
 from config import config
 from modules.marzban.actions import api as marzban_api
@@ -30,84 +38,107 @@ from database import engine as db_engine
 LOG_FILE = "bot.log"
 LOGGER = logging.getLogger(__name__)
 
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per log line, for LOG_FORMAT=json."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _ExcInfoQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps exc_info on the queued record. The base prepare()
+    folds the traceback into the message text, which would hide it from
+    JsonLogFormatter's "exc_info" field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Merge the arguments now, while they still hold the values they had at the call.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+_log_listener = None
+
+
 def setup_logging():
+    """
+    Routes all logging through a QueueHandler. The file and console handlers run
+    on a QueueListener thread, so LOGGER calls on the event loop never wait for
+    disk writes or log rotation.
+    """
+    global _log_listener
     if logging.getLogger().hasHandlers(): return
-    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if config.LOG_FORMAT == "json":
+        log_formatter = JsonLogFormatter()
+    else:
+        log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
     file_handler.setFormatter(log_formatter)
     file_handler.setLevel(logging.DEBUG)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(log_formatter)
     console_handler.setLevel(logging.INFO)
+
+    log_queue = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(_ExcInfoQueueHandler(log_queue))
     logging.getLogger("httpx").setLevel(logging.WARNING)
+    for logger_name, level in config.LOG_LEVELS.items():
+        logging.getLogger(logger_name).setLevel(level)
     LOGGER.info("Logging configured successfully.")
 
-async def debug_update_logger(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if update.effective_user:
-        user_info = f"User(ID:{update.effective_user.id}, Name:'{update.effective_user.full_name}')"
-    else:
-        user_info = "User:N/A (Channel or System Update)"
 
-    if update.message and update.message.text:
-        text = update.message.text
-        char_codes = [ord(c) for c in text]
-        LOGGER.info(f"[DEBUG_LOGGER] Message from {user_info} | Text: '{text}' | CharCodes: {char_codes}")
-    
-    elif update.callback_query:
-        data = update.callback_query.data
-        LOGGER.info(f"[DEBUG_LOGGER] Callback from {user_info} | Data: '{data}'")
-    
-    else:
-        LOGGER.info(f"[DEBUG_LOGGER] Received an unhandled update type from {user_info}")
+def stop_logging():
+    """Writes out any queued log records and stops the listener thread."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
 
 async def heartbeat(context: ContextTypes.DEFAULT_TYPE):
     LOGGER.info("❤️ Heartbeat: Bot is alive and the JobQueue is running.")
 
 async def update_user_activity(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     if isinstance(update, Update) and update.effective_user:
-        user_id = update.effective_user.id
-        try:
-            await crud_user.update_last_activity(user_id)
-        except Exception as e:
-            LOGGER.error(f"Failed to update last activity for {user_id}: {e}")
+        record_activity(update.effective_user.id)
 
 
 async def post_init(application: Application):
     await db_engine.init_db()
     # await db_manager.create_pool() # This is now removed
     await marzban_api.init_marzban_credentials()
-
-    from modules.general import handler as general_handler
-    from modules.marzban import handler as marzban_handler
-    from modules.customer import handler as customer_handler
-    from modules.bot_settings import handler as bot_settings_handler
-    from modules.reminder import handler as reminder_handler
-    from modules.guides import handler as guides_handler
-    general_handler.register(application)
-    marzban_handler.register(application)
-    customer_handler.register(application)
-    bot_settings_handler.register(application)
-    reminder_handler.register(application)
-    guides_handler.register(application)
-    financials_handler.register(application)
-    payment_handler.register(application)
-    broadcaster_handler.register(application)
-    user_info_handler.register(application)
-    application.add_handler(TypeHandler(Update, update_user_activity), group=-1)
+    await load_trace_setting()
+    # Before polling starts, so only broadcasts interrupted by the last shutdown are resumed.
+    await resume_unfinished_broadcasts(application)
 
 
 async def post_shutdown(application: Application):
     LOGGER.info("Shutdown signal received. Closing resources...")
     await marzban_api.close_client()
     LOGGER.info("HTTPX client closed gracefully.")
+    await flush_activity()
     # await db_manager.close_pool() # This is now removed
     LOGGER.info("Database pool (legacy) is no longer used.")
     await db_engine.close_db()
     LOGGER.info("Database engine (SQLAlchemy) closed gracefully.")
+    stop_update_trace()
 
 def main() -> None:
     setup_logging()
@@ -124,7 +155,6 @@ def main() -> None:
     from modules.customer import handler as customer_handler
     from modules.marzban import handler as marzban_handler
     from modules.reminder import handler as reminder_handler
-    from modules.financials import handler as financials_handler
     from modules.stats import handler as stats_handler
     from modules.guides import handler as guides_handler
 
@@ -138,26 +168,35 @@ def main() -> None:
         .build()
     )
 
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, debug_update_logger), group=-1)
-    application.add_handler(CallbackQueryHandler(debug_update_logger), group=-1)
-    LOGGER.info("Universal debug logger has been activated.")
-    
-    broadcaster_handler.register(application)
-    marzban_handler.register(application)
+    start_update_trace()
+    application.add_handler(TypeHandler(Update, trace_update), group=-3)
     
-    general_handler.register(application)
-    financials_handler.register(application)
-    reminder_handler.register(application)
-    customer_handler.register(application)
-    bot_settings_handler.register(application)
-    stats_handler.register(application)
-    guides_handler.register(application)
-    payment_handler.register(application)
+    # Own group: in group -1 the maintenance gatekeeper matches every update first.
+    application.add_handler(TypeHandler(Update, update_user_activity), group=-2)
+
+    # Order matters: within a group, the first matching handler wins.
+    register_modules(application, [
+        broadcaster_handler,
+        marzban_handler,
+        general_handler,
+        financials_handler,
+        reminder_handler,
+        customer_handler,
+        bot_settings_handler,
+        stats_handler,
+        guides_handler,
+        payment_handler,
+        user_info_handler,
+    ])
     
     if application.job_queue:
         application.job_queue.run_repeating(heartbeat, interval=3600, first=10, name="heartbeat")
         application.job_queue.run_repeating(cleanup_expired_test_accounts, interval=3600, first=60, name="cleanup_test_accounts")
         LOGGER.info("❤️ Heartbeat and Test Account Cleanup jobs scheduled to run every hour.")
+        application.job_queue.run_repeating(sync_panel_users_job, interval=config.PANEL_MIRROR_SYNC_INTERVAL, first=30, name="panel_mirror_sync")
+        LOGGER.info(f"Panel mirror sync job scheduled to run every {config.PANEL_MIRROR_SYNC_INTERVAL} seconds.")
+        application.job_queue.run_repeating(watch_translations_job, interval=10, first=10, name="watch_translations")
+        application.job_queue.run_repeating(flush_activity_job, interval=config.ACTIVITY_FLUSH_INTERVAL, first=config.ACTIVITY_FLUSH_INTERVAL, name="flush_user_activity")
 
     BOT_DOMAIN = os.getenv("BOT_DOMAIN")
     WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
@@ -23,6 +23,22 @@ except Exception:
 
 LOGGER = logging.getLogger(__name__)
 
+
+def _parse_log_levels(raw: str) -> dict:
+    """Parses "logger=LEVEL,other.logger=LEVEL" into {logger: level}, skipping invalid entries."""
+    levels = {}
+    for entry in raw.split(","):
+        name, _sep, level = entry.partition("=")
+        name, level = name.strip(), level.strip().upper()
+        if not name or not level:
+            continue
+        if not isinstance(logging.getLevelName(level), int):
+            LOGGER.error(f"LOG_LEVELS entry '{entry.strip()}' has an unknown level. Ignoring it.")
+            continue
+        levels[name] = level
+    return levels
+
+
 class Config:
     # --- Telegram Bot Configuration (Critical for startup) ---
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -45,4 +61,44 @@ class Config:
     if not SUPPORT_USERNAME:
         LOGGER.info("SUPPORT_USERNAME is not set. 'Support' button will not be shown.")
 
+    # --- Panel User Snapshot (Optional) ---
+    # Seconds the in-memory copy of the Marzban user list is reused before re-fetching.
+    try:
+        PANEL_USERS_CACHE_TTL = int(os.getenv("PANEL_USERS_CACHE_TTL", "60"))
+    except ValueError:
+        PANEL_USERS_CACHE_TTL = 60
+        LOGGER.error("PANEL_USERS_CACHE_TTL is not a valid integer. Falling back to 60 seconds.")
+
+    # --- Panel Mirror Sync (Optional) ---
+    # Seconds between syncs of the local panel_users table with the Marzban panel.
+    try:
+        PANEL_MIRROR_SYNC_INTERVAL = int(os.getenv("PANEL_MIRROR_SYNC_INTERVAL", "300"))
+    except ValueError:
+        PANEL_MIRROR_SYNC_INTERVAL = 300
+        LOGGER.error("PANEL_MIRROR_SYNC_INTERVAL is not a valid integer. Falling back to 300 seconds.")
+
+    # Seconds between flushes of buffered user last_activity timestamps to the database.
+    try:
+        ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))
+    except ValueError:
+        ACTIVITY_FLUSH_INTERVAL = 30
+        LOGGER.error("ACTIVITY_FLUSH_INTERVAL is not a valid integer. Falling back to 30 seconds.")
+
+    # --- Update Trace (Optional) ---
+    # Fraction of updates written to update_trace.log while tracing is enabled in the bot settings.
+    try:
+        UPDATE_TRACE_SAMPLE_RATE = min(max(float(os.getenv("UPDATE_TRACE_SAMPLE_RATE", "0.1")), 0.0), 1.0)
+    except ValueError:
+        UPDATE_TRACE_SAMPLE_RATE = 0.1
+        LOGGER.error("UPDATE_TRACE_SAMPLE_RATE is not a valid number. Falling back to 0.1.")
+
+    # --- Logging (Optional) ---
+    # "text" (default) or "json" for one JSON object per line in bot.log and on the console.
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+    if LOG_FORMAT not in ("text", "json"):
+        LOGGER.error(f"LOG_FORMAT '{LOG_FORMAT}' is not supported. Falling back to 'text'.")
+        LOG_FORMAT = "text"
+    # Per-logger level overrides, e.g. "httpx=WARNING,modules.reminder=INFO".
+    LOG_LEVELS = _parse_log_levels(os.getenv("LOG_LEVELS", ""))
+
 config = Config()
\ No newline at end of file
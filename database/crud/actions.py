@@ -1,5 +1,9 @@
 # --- START OF FILE database/crud/actions.py ---
 import logging
+from typing import Iterable
+
+from sqlalchemy import delete
+
 from ..engine import get_session
 from ..models.user_note import UserNote
 from ..models.marzban_link import MarzbanTelegramLink
@@ -8,6 +12,16 @@ from ..models.bot_managed_user import BotManagedUser
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximum number of usernames per IN (...) clause.
+_IN_CLAUSE_CHUNK_SIZE = 1000
+# Every table keyed by Marzban username that must be cleared when the panel user is deleted.
+_USER_DATA_COLUMNS = (
+    UserNote.username,
+    MarzbanTelegramLink.marzban_username,
+    NonRenewalUser.marzban_username,
+    BotManagedUser.marzban_username,
+)
+
 
 async def cleanup_marzban_user_data(marzban_username: str) -> bool:
     """
@@ -16,22 +30,8 @@ async def cleanup_marzban_user_data(marzban_username: str) -> bool:
     """
     async with get_session() as session:
         try:
-            # Find all related objects to delete
-            note = await session.get(UserNote, marzban_username)
-            if note:
-                await session.delete(note)
-
-            link = await session.get(MarzbanTelegramLink, marzban_username)
-            if link:
-                await session.delete(link)
-
-            non_renewal = await session.get(NonRenewalUser, marzban_username)
-            if non_renewal:
-                await session.delete(non_renewal)
-
-            managed_user = await session.get(BotManagedUser, marzban_username)
-            if managed_user:
-                await session.delete(managed_user)
+            for column in _USER_DATA_COLUMNS:
+                await session.execute(delete(column.class_).where(column == marzban_username))
             
             # Commit all deletions at once
             await session.commit()
@@ -45,4 +45,27 @@ async def cleanup_marzban_user_data(marzban_username: str) -> bool:
             )
             return False
 
+
+async def cleanup_marzban_users_bulk(marzban_usernames: Iterable[str]) -> bool:
+    """
+    Removes all bot data for many Marzban usernames in one transaction,
+    with one DELETE ... IN per table and chunk instead of per-user lookups.
+    """
+    usernames = list(dict.fromkeys(marzban_usernames))
+    if not usernames:
+        return True
+    async with get_session() as session:
+        try:
+            for i in range(0, len(usernames), _IN_CLAUSE_CHUNK_SIZE):
+                chunk = usernames[i:i + _IN_CLAUSE_CHUNK_SIZE]
+                for column in _USER_DATA_COLUMNS:
+                    await session.execute(delete(column.class_).where(column.in_(chunk)))
+            await session.commit()
+            LOGGER.info(f"Successfully cleaned up all data for {len(usernames)} Marzban users.")
+            return True
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Transaction rolled back during bulk cleanup of {len(usernames)} Marzban users: {e}", exc_info=True)
+            return False
+
 # --- END OF FILE database/crud/actions.py ---
\ No newline at end of file
@@ -1,14 +1,18 @@
 # --- START OF FILE database/crud/broadcast.py ---
 import logging
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
+from sqlalchemy import select, update, func, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..engine import get_session
-from ..models.broadcast import Broadcast
+from ..models.broadcast import Broadcast, BroadcastRecipient
 
 LOGGER = logging.getLogger(__name__)
 
+# Keeps IN lists and multi-row inserts well below MySQL's placeholder limit.
+_WRITE_BATCH_SIZE = 1000
+
 
 async def log_broadcast(
     admin_id: int,
@@ -23,7 +27,9 @@ async def log_broadcast(
                 admin_id=admin_id,
                 message_content=message_content,
                 success_count=success_count,
-                failure_count=failure_count
+                failure_count=failure_count,
+                status="completed",
+                total_count=success_count + failure_count
             )
             session.add(new_broadcast)
             await session.commit()
@@ -33,4 +39,179 @@ async def log_broadcast(
             LOGGER.error(f"Could not log broadcast for admin {admin_id}: {e}", exc_info=True)
             return None
 
-# --- END OF FILE database/crud/broadcast.py ---
\ No newline at end of file
+
+async def create_broadcast(admin_id: int, kind: str, message_content: dict, user_ids: List[int]) -> Optional[int]:
+    """
+    Records a new running broadcast together with one pending row per recipient.
+    Returns the broadcast id, or None if it could not be stored.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    async with get_session() as session:
+        try:
+            broadcast = Broadcast(
+                admin_id=admin_id,
+                message_content=message_content,
+                kind=kind,
+                status="running",
+                total_count=len(user_ids)
+            )
+            session.add(broadcast)
+            await session.flush()
+            for i in range(0, len(user_ids), _WRITE_BATCH_SIZE):
+                rows = [
+                    {"broadcast_id": broadcast.broadcast_id, "user_id": user_id, "status": "pending"}
+                    for user_id in user_ids[i:i + _WRITE_BATCH_SIZE]
+                ]
+                await session.execute(insert(BroadcastRecipient), rows)
+            await session.commit()
+            return broadcast.broadcast_id
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Could not create broadcast for admin {admin_id}: {e}", exc_info=True)
+            return None
+
+
+async def get_broadcast(broadcast_id: int) -> Optional[Broadcast]:
+    async with get_session() as session:
+        return await session.get(Broadcast, broadcast_id)
+
+
+async def get_unfinished_broadcasts() -> List[Broadcast]:
+    """Returns broadcasts that were still running when the bot stopped."""
+    async with get_session() as session:
+        result = await session.execute(
+            select(Broadcast).where(Broadcast.status == "running").order_by(Broadcast.broadcast_id)
+        )
+        return list(result.scalars().all())
+
+
+async def get_recipient_ids(broadcast_id: int, status: str = "pending") -> List[int]:
+    async with get_session() as session:
+        result = await session.execute(
+            select(BroadcastRecipient.user_id)
+            .where(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.status == status)
+            .order_by(BroadcastRecipient.user_id)
+        )
+        return list(result.scalars().all())
+
+
+async def set_recipients_status(broadcast_id: int, user_ids: Iterable[int], status: str) -> bool:
+    """Moves the given recipients of a broadcast to a new status."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return True
+    async with get_session() as session:
+        try:
+            for i in range(0, len(user_ids), _WRITE_BATCH_SIZE):
+                await session.execute(
+                    update(BroadcastRecipient)
+                    .where(
+                        BroadcastRecipient.broadcast_id == broadcast_id,
+                        BroadcastRecipient.user_id.in_(user_ids[i:i + _WRITE_BATCH_SIZE])
+                    )
+                    .values(status=status)
+                )
+            await session.commit()
+            return True
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Could not mark {len(user_ids)} recipients of broadcast {broadcast_id} as '{status}': {e}", exc_info=True)
+            return False
+
+
+async def claim_recipients(broadcast_id: int, user_ids: Iterable[int]) -> Optional[List[int]]:
+    """
+    Moves the given recipients from 'pending' to 'sending' and returns the ones
+    this call claimed. Rows are locked while they are read, so two jobs running
+    the same broadcast never claim the same recipient.
+    Returns None if the claim could not be written.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    claimed: List[int] = []
+    async with get_session() as session:
+        try:
+            for i in range(0, len(user_ids), _WRITE_BATCH_SIZE):
+                result = await session.execute(
+                    select(BroadcastRecipient.user_id)
+                    .where(
+                        BroadcastRecipient.broadcast_id == broadcast_id,
+                        BroadcastRecipient.user_id.in_(user_ids[i:i + _WRITE_BATCH_SIZE]),
+                        BroadcastRecipient.status == "pending"
+                    )
+                    .with_for_update()
+                )
+                batch = list(result.scalars().all())
+                if not batch:
+                    continue
+                result = await session.execute(
+                    update(BroadcastRecipient)
+                    .where(
+                        BroadcastRecipient.broadcast_id == broadcast_id,
+                        BroadcastRecipient.user_id.in_(batch),
+                        BroadcastRecipient.status == "pending"
+                    )
+                    .values(status="sending")
+                )
+                if result.rowcount != len(batch):
+                    raise RuntimeError(f"claimed {result.rowcount} of {len(batch)} locked rows")
+                claimed.extend(batch)
+            await session.commit()
+            return claimed
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Could not claim {len(user_ids)} recipients of broadcast {broadcast_id}: {e}", exc_info=True)
+            return None
+
+
+async def release_claimed_recipients(broadcast_id: int) -> int:
+    """
+    Marks recipients that were claimed by a job that never finished as failed.
+    They may already have received the message, so they are never sent to again.
+    """
+    async with get_session() as session:
+        try:
+            result = await session.execute(
+                update(BroadcastRecipient)
+                .where(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.status == "sending")
+                .values(status="failed")
+            )
+            await session.commit()
+            return result.rowcount
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Could not release claimed recipients of broadcast {broadcast_id}: {e}", exc_info=True)
+            return 0
+
+
+async def get_recipient_counts(broadcast_id: int) -> Dict[str, int]:
+    async with get_session() as session:
+        result = await session.execute(
+            select(BroadcastRecipient.status, func.count())
+            .where(BroadcastRecipient.broadcast_id == broadcast_id)
+            .group_by(BroadcastRecipient.status)
+        )
+        return {status: count for status, count in result.all()}
+
+
+async def finish_broadcast(broadcast_id: int) -> Optional[Broadcast]:
+    """Stores the final success/failure counts of a broadcast and marks it completed."""
+    counts = await get_recipient_counts(broadcast_id)
+    async with get_session() as session:
+        try:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if not broadcast:
+                return None
+            broadcast.success_count = counts.get("sent", 0)
+            broadcast.failure_count = counts.get("failed", 0) + counts.get("sending", 0)
+            broadcast.status = "completed"
+            await session.commit()
+            await session.refresh(broadcast)
+            return broadcast
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Could not finish broadcast {broadcast_id}: {e}", exc_info=True)
+            return None
+
+# --- END OF FILE database/crud/broadcast.py ---
@@ -0,0 +1,138 @@
+# --- START OF FILE database/crud/panel_user.py ---
+import hashlib
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from ..engine import get_session
+from ..models.panel_user import PanelUser
+
+LOGGER = logging.getLogger(__name__)
+
+# The panel fields copied into the mirror, in a fixed order for hashing.
+MIRRORED_FIELDS = ('username', 'status', 'expire', 'data_limit', 'used_traffic', 'online_at', 'subscription_url')
+
+# MySQL limits the number of placeholders per statement; keep batches well below it.
+_WRITE_BATCH_SIZE = 1000
+
+
+def panel_user_to_row(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts a user dict from the Marzban API into a panel_users row (including its hash)."""
+    row = {
+        'username': user['username'],
+        'status': user.get('status') or 'disabled',
+        'expire': user.get('expire') or None,
+        'data_limit': user.get('data_limit') or 0,
+        'used_traffic': user.get('used_traffic') or 0,
+        'online_at': user.get('online_at'),
+        'subscription_url': user.get('subscription_url'),
+    }
+    row['row_hash'] = compute_row_hash(row)
+    return row
+
+
+def compute_row_hash(row: Dict[str, Any]) -> str:
+    payload = json.dumps([row.get(field) for field in MIRRORED_FIELDS], separators=(',', ':'), default=str)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def _to_user_dict(panel_user: PanelUser) -> Dict[str, Any]:
+    """Returns a mirror row in the same shape as a user dict from the Marzban API."""
+    return {field: getattr(panel_user, field) for field in MIRRORED_FIELDS}
+
+
+async def get_row_hashes() -> Dict[str, str]:
+    """Returns a mapping of username to row hash for every mirrored user."""
+    async with get_session() as session:
+        result = await session.execute(select(PanelUser.username, PanelUser.row_hash))
+        return {row.username: row.row_hash for row in result.all()}
+
+
+async def upsert_panel_users(rows: List[Dict[str, Any]]) -> bool:
+    """Inserts or updates the given rows (as produced by panel_user_to_row) in batches."""
+    if not rows:
+        return True
+    async with get_session() as session:
+        try:
+            for i in range(0, len(rows), _WRITE_BATCH_SIZE):
+                stmt = mysql_insert(PanelUser).values(rows[i:i + _WRITE_BATCH_SIZE])
+                update_values = {field: stmt.inserted[field] for field in (*MIRRORED_FIELDS[1:], 'row_hash')}
+                # ON DUPLICATE KEY UPDATE does not apply the column's onupdate default.
+                update_values['synced_at'] = func.now()
+                stmt = stmt.on_duplicate_key_update(update_values)
+                await session.execute(stmt)
+            await session.commit()
+            return True
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to upsert {len(rows)} panel users into the mirror: {e}", exc_info=True)
+            return False
+
+
+async def update_panel_user_fields(username: str, fields: Dict[str, Any]) -> bool:
+    """Updates selected mirrored fields of one user and recomputes its hash."""
+    async with get_session() as session:
+        try:
+            panel_user = await session.get(PanelUser, username)
+            if not panel_user:
+                return False
+            for field, value in fields.items():
+                if field in MIRRORED_FIELDS and field != 'username':
+                    setattr(panel_user, field, value)
+            panel_user.row_hash = compute_row_hash(_to_user_dict(panel_user))
+            await session.commit()
+            return True
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to update mirrored panel user '{username}': {e}", exc_info=True)
+            return False
+
+
+async def delete_panel_users(usernames: Iterable[str]) -> int:
+    """Removes the given usernames from the mirror. Returns the number of deleted rows."""
+    usernames = list(usernames)
+    if not usernames:
+        return 0
+    deleted = 0
+    async with get_session() as session:
+        try:
+            for i in range(0, len(usernames), _WRITE_BATCH_SIZE):
+                stmt = delete(PanelUser).where(PanelUser.username.in_(usernames[i:i + _WRITE_BATCH_SIZE]))
+                result = await session.execute(stmt)
+                deleted += result.rowcount
+            await session.commit()
+            return deleted
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to delete {len(usernames)} panel users from the mirror: {e}", exc_info=True)
+            return 0
+
+
+async def get_all_panel_users() -> List[Dict[str, Any]]:
+    """Returns every mirrored user as an API-shaped dict."""
+    async with get_session() as session:
+        result = await session.execute(select(PanelUser))
+        return [_to_user_dict(panel_user) for panel_user in result.scalars().all()]
+
+
+async def iter_panel_users(batch_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yields mirrored users in username order, one batch at a time (keyset pagination)."""
+    last_username = None
+    while True:
+        async with get_session() as session:
+            stmt = select(PanelUser).order_by(PanelUser.username).limit(batch_size)
+            if last_username is not None:
+                stmt = stmt.where(PanelUser.username > last_username)
+            result = await session.execute(stmt)
+            batch = [_to_user_dict(panel_user) for panel_user in result.scalars().all()]
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last_username = batch[-1]['username']
+
+# --- END OF FILE database/crud/panel_user.py ---
@@ -2,10 +2,10 @@
 
 import logging
 from decimal import Decimal
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, case
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from telegram import User as TelegramUser
@@ -18,6 +18,10 @@ from ..models.marzban_link import MarzbanTelegramLink
 
 LOGGER = logging.getLogger(__name__)
 
+# Each user in a bulk activity update costs three placeholders (CASE WHEN/THEN and IN).
+_ACTIVITY_CHUNK_SIZE = 500
+_WALLET_CHUNK_SIZE = 500
+
 
 async def get_user_by_id(user_id: int) -> Optional[User]:
     async with get_session() as session:
@@ -59,46 +63,127 @@ async def get_user_wallet_balance(user_id: int) -> Optional[Decimal]:
     return None
 
 
+def _to_decimal(amount: Decimal | float) -> Decimal:
+    return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+
 async def increase_wallet_balance(user_id: int, amount: Decimal | float) -> Optional[Decimal]:
-    if not isinstance(amount, Decimal):
-        amount = Decimal(str(amount))
+    """Atomically credits the wallet and returns the new balance."""
+    amount = _to_decimal(amount)
 
     if amount <= 0:
         LOGGER.warning(f"Attempted to increase wallet with non-positive amount: {amount}")
         return None
 
     async with get_session() as session:
-        user = await session.get(User, user_id)
-        if user:
-            user.wallet_balance += amount
+        try:
+            result = await session.execute(
+                update(User)
+                .where(User.user_id == user_id)
+                .values(wallet_balance=User.wallet_balance + amount)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                await session.rollback()
+                LOGGER.error(f"Failed to increase balance for non-existent user_id: {user_id}")
+                return None
+            # The UPDATE holds the row lock, so this read sees exactly our result.
+            new_balance = await session.scalar(select(User.wallet_balance).where(User.user_id == user_id))
             await session.commit()
-            await session.refresh(user)
-            return user.wallet_balance
-    LOGGER.error(f"Failed to increase balance for non-existent user_id: {user_id}")
-    return None
+            return new_balance
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to increase balance for user {user_id}: {e}", exc_info=True)
+            return None
 
 
 async def decrease_wallet_balance(user_id: int, amount: Decimal | float) -> Optional[Decimal]:
-    if not isinstance(amount, Decimal):
-        amount = Decimal(str(amount))
+    """
+    Atomically debits the wallet if it holds at least `amount`.
+    Returns the new balance, or None if the user is missing or funds are insufficient.
+    """
+    amount = _to_decimal(amount)
 
     if amount <= 0:
         LOGGER.warning(f"Attempted to decrease wallet with non-positive amount: {amount}")
         return None
 
     async with get_session() as session:
-        user = await session.get(User, user_id)
-        if user:
-            if user.wallet_balance >= amount:
-                user.wallet_balance -= amount
-                await session.commit()
-                await session.refresh(user)
-                return user.wallet_balance
-            else:
-                LOGGER.warning(f"Insufficient funds for user {user_id} to decrease by {amount}.")
+        try:
+            result = await session.execute(
+                update(User)
+                .where(User.user_id == user_id, User.wallet_balance >= amount)
+                .values(wallet_balance=User.wallet_balance - amount)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                await session.rollback()
+                if await session.scalar(select(User.user_id).where(User.user_id == user_id)) is None:
+                    LOGGER.error(f"Failed to decrease balance for non-existent user_id: {user_id}")
+                else:
+                    LOGGER.warning(f"Insufficient funds for user {user_id} to decrease by {amount}.")
                 return None
-    LOGGER.error(f"Failed to decrease balance for non-existent user_id: {user_id}")
-    return None
+            new_balance = await session.scalar(select(User.wallet_balance).where(User.user_id == user_id))
+            await session.commit()
+            return new_balance
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to decrease balance for user {user_id}: {e}", exc_info=True)
+            return None
+
+
+async def increase_wallet_balances(credits: Dict[int, Decimal | float]) -> Optional[int]:
+    """
+    Credits many wallets at once with one UPDATE ... CASE statement per chunk.
+    Non-positive amounts and unknown users are skipped. Returns the number of
+    credited users, or None if the transaction failed (nothing is credited then).
+    """
+    credits = {user_id: _to_decimal(amount) for user_id, amount in credits.items()}
+    credits = {user_id: amount for user_id, amount in credits.items() if amount > 0}
+    if not credits:
+        return 0
+
+    user_ids = list(credits)
+    updated = 0
+    async with get_session() as session:
+        try:
+            for i in range(0, len(user_ids), _WALLET_CHUNK_SIZE):
+                chunk = user_ids[i:i + _WALLET_CHUNK_SIZE]
+                result = await session.execute(
+                    update(User)
+                    .where(User.user_id.in_(chunk))
+                    .values(wallet_balance=User.wallet_balance + case({uid: credits[uid] for uid in chunk}, value=User.user_id))
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
+            await session.commit()
+            return updated
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to credit {len(user_ids)} wallets: {e}", exc_info=True)
+            return None
+
+
+async def increase_balance_for_all_users(amount: Decimal | float) -> Optional[int]:
+    """Credits every user's wallet with one UPDATE. Returns the number of credited users, or None on error."""
+    amount = _to_decimal(amount)
+    if amount <= 0:
+        LOGGER.warning(f"Attempted to increase all wallets with non-positive amount: {amount}")
+        return None
+
+    async with get_session() as session:
+        try:
+            result = await session.execute(
+                update(User)
+                .values(wallet_balance=User.wallet_balance + amount)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to increase balance for all users by {amount}: {e}", exc_info=True)
+            return None
 
 
 async def get_user_by_marzban_username(marzban_username: str) -> Optional[User]:
@@ -178,6 +263,34 @@ async def update_last_activity(user_id: int) -> bool:
             LOGGER.error(f"Failed to update last activity for {user_id}: {e}")
             return False
 
+async def bulk_update_last_activity(activity: Dict[int, datetime]) -> int:
+    """
+    Sets last_activity for many users with one UPDATE ... CASE statement per chunk.
+    Unknown user ids are ignored. Returns the number of updated rows, or -1 on error.
+    """
+    if not activity:
+        return 0
+    user_ids = list(activity)
+    updated = 0
+    async with get_session() as session:
+        try:
+            for i in range(0, len(user_ids), _ACTIVITY_CHUNK_SIZE):
+                chunk = user_ids[i:i + _ACTIVITY_CHUNK_SIZE]
+                stmt = (
+                    update(User)
+                    .where(User.user_id.in_(chunk))
+                    .values(last_activity=case({uid: activity[uid] for uid in chunk}, value=User.user_id))
+                    .execution_options(synchronize_session=False)
+                )
+                result = await session.execute(stmt)
+                updated += result.rowcount
+            await session.commit()
+            return updated
+        except Exception as e:
+            await session.rollback()
+            LOGGER.error(f"Failed to flush last activity for {len(user_ids)} users: {e}", exc_info=True)
+            return -1
+
 async def get_user_with_relations(user_id: int) -> Optional[User]:
     async with get_session() as session:
         try:
@@ -1,7 +1,7 @@
 # --- START OF FILE database/crud/user_note.py (REVISED) ---
 import logging
 from decimal import Decimal
-from typing import Optional, List # <--- List را اضافه کنید
+from typing import Optional, List, Dict, Iterable # <--- List را اضافه کنید
 
 from sqlalchemy import delete # <--- delete را اضافه کنید
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,6 +12,9 @@ from ..models.user_note import UserNote
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximum number of usernames per IN (...) clause.
+_IN_CLAUSE_CHUNK_SIZE = 1000
+
 
 async def get_user_note(marzban_username: str) -> Optional[UserNote]:
     """Retrieves subscription details for a specific marzban user."""
@@ -19,6 +22,27 @@ async def get_user_note(marzban_username: str) -> Optional[UserNote]:
         return await session.get(UserNote, marzban_username)
 
 
+async def get_user_notes_map(marzban_usernames: Optional[Iterable[str]] = None) -> Dict[str, UserNote]:
+    """
+    Retrieves notes for many users at once, keyed by username.
+    With no usernames, every note is returned; otherwise the lookup is done
+    with chunked IN queries. Usernames without a note are absent from the result.
+    """
+    async with get_session() as session:
+        if marzban_usernames is None:
+            result = await session.execute(select(UserNote))
+            return {note.username: note for note in result.scalars().all()}
+
+        usernames = list(dict.fromkeys(marzban_usernames))
+        notes_map: Dict[str, UserNote] = {}
+        for i in range(0, len(usernames), _IN_CLAUSE_CHUNK_SIZE):
+            stmt = select(UserNote).where(UserNote.username.in_(usernames[i:i + _IN_CLAUSE_CHUNK_SIZE]))
+            result = await session.execute(stmt)
+            for note in result.scalars().all():
+                notes_map[note.username] = note
+        return notes_map
+
+
 async def create_or_update_user_note(
     marzban_username: str,
     price: Optional[Decimal] = None,
@@ -7,8 +7,10 @@ from typing import TYPE_CHECKING, Optional
 from sqlalchemy import (
     BigInteger,
     ForeignKey,
+    Index,
     Integer,
     JSON,
+    String,
     TIMESTAMP,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -32,6 +34,11 @@ class Broadcast(Base):
     )
     success_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     failure_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 'builder', 'forward' or 'gift'; decides how an unfinished broadcast is resumed.
+    kind: Mapped[str] = mapped_column(String(16), nullable=False, default="builder", server_default="builder")
+    # 'running' until every recipient was processed, then 'completed'.
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="running", server_default="completed")
+    total_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationship to the User model (the admin who sent the broadcast)
     admin: Mapped["User"] = relationship(back_populates="broadcasts")
@@ -39,4 +46,22 @@ class Broadcast(Base):
     def __repr__(self) -> str:
         return f"<Broadcast(id={self.broadcast_id}, admin_id={self.admin_id})>"
 
+
+class BroadcastRecipient(Base):
+    """Delivery state of one broadcast for one user, so a broadcast can resume after a restart."""
+    __tablename__ = "broadcast_recipients"
+    __table_args__ = (
+        Index("ix_broadcast_recipients_status", "broadcast_id", "status"),
+    )
+
+    broadcast_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("broadcasts.broadcast_id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    # 'pending' -> 'sending' (claimed by a running job) -> 'sent' or 'failed'.
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+
+    def __repr__(self) -> str:
+        return f"<BroadcastRecipient(broadcast_id={self.broadcast_id}, user_id={self.user_id}, status='{self.status}')>"
+
 # --- END OF FILE database/models/broadcast.py ---
\ No newline at end of file
@@ -0,0 +1,33 @@
+# --- START OF FILE database/models/panel_user.py ---
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, String, Text, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from . import Base
+
+
+class PanelUser(Base):
+    """A local mirror of one user on the Marzban panel, kept up to date by a sync job."""
+    __tablename__ = "panel_users"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    status: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    expire: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
+    data_limit: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    used_traffic: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # Kept as the panel's ISO string so consumers can parse it exactly like live API data.
+    online_at: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    subscription_url: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Hash of the mirrored fields; the sync job only writes rows whose hash changed.
+    row_hash: Mapped[str] = mapped_column(String(32), nullable=False)
+    synced_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP, nullable=False, server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<PanelUser(username='{self.username}', status='{self.status}')>"
+
+# --- END OF FILE database/models/panel_user.py ---
@@ -10,6 +10,7 @@ from shared.keyboards import (
 )
 from .data_manager import is_bot_active, set_bot_status
 from database.crud import bot_setting as crud_bot_setting
+from shared import update_trace
 from shared.translator import _
 
 LOGGER = logging.getLogger(__name__)
@@ -75,12 +76,17 @@ async def _build_and_send_main_settings_menu(update: Update, context: ContextTyp
     forced_join_btn_text = _("bot_settings.status_active") if is_forced_join_enabled else _("bot_settings.status_inactive")
     forced_join_callback = "toggle_forced_join_disable" if is_forced_join_enabled else "toggle_forced_join_enable"
 
+    is_update_trace_enabled = bot_settings.get(update_trace.SETTING_KEY, False)
+    update_trace_btn_text = _("bot_settings.status_active") if is_update_trace_enabled else _("bot_settings.status_inactive")
+    update_trace_callback = "toggle_update_trace_disable" if is_update_trace_enabled else "toggle_update_trace_enable"
+
     from telegram import InlineKeyboardButton, InlineKeyboardMarkup
     keyboard = [
         [InlineKeyboardButton(maintenance_btn_text, callback_data=maintenance_callback), InlineKeyboardButton(_("bot_settings.label_bot_status"), callback_data="noop")],
         [InlineKeyboardButton(log_channel_btn_text, callback_data=log_channel_callback), InlineKeyboardButton(_("bot_settings.label_log_channel"), callback_data="noop")],
         [InlineKeyboardButton(wallet_btn_text, callback_data=wallet_callback), InlineKeyboardButton(_("bot_settings.label_wallet_status"), callback_data="noop")],
         [InlineKeyboardButton(forced_join_btn_text, callback_data=forced_join_callback), InlineKeyboardButton(_("bot_settings.label_forced_join"), callback_data="noop")],
+        [InlineKeyboardButton(update_trace_btn_text, callback_data=update_trace_callback), InlineKeyboardButton(_("bot_settings.label_update_trace"), callback_data="noop")],
         [InlineKeyboardButton(_("bot_settings.button_back_to_tools"), callback_data="bot_status_back")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -143,6 +149,17 @@ async def toggle_forced_join_status(update: Update, context: ContextTypes.DEFAUL
     return MENU_STATE
 
 
+async def toggle_update_trace(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    new_status = (query.data == "toggle_update_trace_enable")
+    await crud_bot_setting.save_bot_settings({update_trace.SETTING_KEY: new_status})
+    update_trace.set_trace_enabled(new_status)
+    feedback = _("bot_settings.feedback_update_trace_enabled") if new_status else _("bot_settings.feedback_update_trace_disabled")
+    await query.answer(feedback, show_alert=True)
+    await _build_and_send_main_settings_menu(update, context)
+    return MENU_STATE
+
+
 async def prompt_for_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     bot_settings = await crud_bot_setting.load_bot_settings()
     current_channel_id = bot_settings.get('log_channel_id', _("marzban_credentials.not_set"))
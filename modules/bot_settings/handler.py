@@ -9,7 +9,7 @@ from shared.keyboards import get_settings_and_tools_keyboard, get_helper_tools_k
 from .actions import (
     start_bot_settings, toggle_maintenance_mode, toggle_log_channel, toggle_wallet_status,
     prompt_for_channel_id, process_channel_id, MENU_STATE, SET_CHANNEL_ID,
-    toggle_forced_join_status, prompt_for_forced_join_channel, process_forced_join_channel,
+    toggle_forced_join_status, toggle_update_trace, prompt_for_forced_join_channel, process_forced_join_channel,
     GET_FORCED_JOIN_CHANNEL,
     show_helper_tools_menu, back_to_settings_menu,
     start_test_account_settings, toggle_test_account_activation,
@@ -39,6 +39,7 @@ def register(application: Application) -> None:
                 CallbackQueryHandler(toggle_log_channel, pattern=r'^toggle_log_channel_'),
                 CallbackQueryHandler(toggle_wallet_status, pattern=r'^toggle_wallet_'),
                 CallbackQueryHandler(toggle_forced_join_status, pattern=r'^toggle_forced_join_'),
+                CallbackQueryHandler(toggle_update_trace, pattern=r'^toggle_update_trace_'),
             ]
         },
         fallbacks=[
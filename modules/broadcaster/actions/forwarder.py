@@ -4,16 +4,16 @@
 
 import logging
 import uuid
-import asyncio
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
 
 from shared.translator import _
+from shared.broadcast import run_broadcast, run_checkpointed_broadcast
 from shared.keyboards import get_message_builder_cancel_keyboard
 # --- MODIFIED IMPORT ---
 from database.crud import user as crud_user
+from database.crud import broadcast as crud_broadcast
 # --- ----------------- ---
 
 LOGGER = logging.getLogger(__name__)
@@ -79,24 +79,27 @@ async def forward_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     from_chat_id = job_data['from_chat_id']
     message_id = job_data['message_id']
 
-    user_ids = await crud_user.get_all_user_ids()
-    total = len(user_ids)
-    success, failure = 0, 0
-    
-    LOGGER.info(f"Starting forward broadcast job '{context.job.name}' for {total} users.")
-
-    for user_id in user_ids:
-        try:
-            await context.bot.forward_message(
-                chat_id=user_id,
-                from_chat_id=from_chat_id,
-                message_id=message_id
-            )
-            success += 1
-        except TelegramError as e:
-            failure += 1
-            LOGGER.warning(f"Forward broadcast failed for user {user_id}: {e}")
-        await asyncio.sleep(0.1) # Rate limit: 10 messages per second
+    broadcast_id = job_data.get('broadcast_id')
+    forward_kwargs = {"from_chat_id": from_chat_id, "message_id": message_id}
+
+    if broadcast_id is None:
+        user_ids = await crud_user.get_all_user_ids()
+        LOGGER.info(f"Starting forward broadcast job '{context.job.name}' for {len(user_ids)} users.")
+        broadcast_id = await crud_broadcast.create_broadcast(admin_id, "forward", forward_kwargs, user_ids)
+    else:
+        LOGGER.info(f"Resuming forward broadcast job '{context.job.name}' (broadcast {broadcast_id}).")
+
+    if broadcast_id is not None:
+        stats = await run_checkpointed_broadcast(
+            context.bot, broadcast_id, context.bot.forward_message, name=context.job.name, status_chat_id=admin_id,
+            **forward_kwargs
+        )
+    else:
+        stats = await run_broadcast(
+            context.bot, user_ids, context.bot.forward_message, name=context.job.name, status_chat_id=admin_id,
+            **forward_kwargs
+        )
+    total, success, failure = stats.total, stats.sent, stats.failed
 
     report = _("broadcaster.job_report", job_id=context.job.name, total=total, success=success, failure=failure)
     
@@ -1,7 +1,6 @@
 # --- START OF FILE modules/broadcaster/actions/main.py (REVISED) ---
 
 import logging
-import asyncio
 import html
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
@@ -9,6 +8,7 @@ from telegram.constants import ParseMode
 from telegram.error import TelegramError
 
 from shared.translator import _
+from shared.broadcast import run_broadcast, run_checkpointed_broadcast
 from shared.keyboards import get_broadcaster_menu_keyboard, get_message_builder_cancel_keyboard, get_deeplink_targets_keyboard
 # --- MODIFIED IMPORTS ---
 from database.crud import broadcast as crud_broadcast
@@ -291,11 +291,15 @@ async def show_broadcast_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text(_("broadcaster.main_menu_prompt"), reply_markup=keyboard)
 
 async def send_broadcast_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Executes the broadcast, then logs the result to the database."""
+    """
+    Executes the broadcast and records per-recipient progress in the database.
+    If job data carries a 'broadcast_id', an interrupted broadcast is resumed instead.
+    """
     job_data = context.job.data
     admin_id = job_data.get("admin_id")
     message_content = job_data.get("message_content", {})
     target_user_ids = job_data.get("target_user_ids", [])
+    broadcast_id = job_data.get("broadcast_id")
 
     LOGGER.info(f"Starting broadcast job for admin {admin_id}")
     
@@ -304,38 +308,41 @@ async def send_broadcast_message_job(context: ContextTypes.DEFAULT_TYPE) -> None
     buttons = message_content.get("buttons", [])
     reply_markup = _build_reply_markup_from_data({'buttons': buttons})
 
-    if not target_user_ids:
-        target_user_ids = await crud_user.get_all_user_ids()
+    if photo_id:
+        send = context.bot.send_photo
+        send_kwargs = {"photo": photo_id, "caption": text, "parse_mode": ParseMode.HTML, "reply_markup": reply_markup}
+    else:
+        send = context.bot.send_message
+        send_kwargs = {"text": text, "parse_mode": ParseMode.HTML, "reply_markup": reply_markup}
 
-    if not target_user_ids:
-        LOGGER.warning("Broadcast job stopped: No target users found.")
-        await context.bot.send_message(admin_id, _("broadcaster.errors.no_users_found"))
-        return
-        
-    total, success, failure = len(target_user_ids), 0, 0
+    job_id = context.job.name
+    if broadcast_id is None:
+        if not target_user_ids:
+            target_user_ids = await crud_user.get_all_user_ids()
 
-    for user_id in target_user_ids:
-        try:
-            if photo_id:
-                await context.bot.send_photo(chat_id=user_id, photo=photo_id, caption=text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-            else:
-                await context.bot.send_message(chat_id=user_id, text=text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-            success += 1
-        except TelegramError as e:
-            failure += 1
-            LOGGER.warning(f"Broadcast failed for user {user_id}: {e}")
-        await asyncio.sleep(0.1)
-
-    # --- ✨ SQLAlchemy Integration: Log the final result ✨ ---
-    await crud_broadcast.log_broadcast(
-        admin_id=admin_id,
-        message_content=message_content,
-        success_count=success,
-        failure_count=failure
-    )
-    # --- ---------------------------------------------------- ---
+        if not target_user_ids:
+            LOGGER.warning("Broadcast job stopped: No target users found.")
+            await context.bot.send_message(admin_id, _("broadcaster.errors.no_users_found"))
+            return
 
-    report = _("broadcaster.job_report", total=total, success=success, failure=failure)
+        broadcast_id = await crud_broadcast.create_broadcast(admin_id, "builder", message_content, target_user_ids)
+
+    if broadcast_id is not None:
+        stats = await run_checkpointed_broadcast(
+            context.bot, broadcast_id, send, name=job_id, status_chat_id=admin_id, **send_kwargs
+        )
+    else:
+        # The broadcast could not be recorded; send it anyway, just without resume support.
+        stats = await run_broadcast(context.bot, target_user_ids, send, name=job_id, status_chat_id=admin_id, **send_kwargs)
+        await crud_broadcast.log_broadcast(
+            admin_id=admin_id,
+            message_content=message_content,
+            success_count=stats.sent,
+            failure_count=stats.failed
+        )
+    total, success, failure = stats.total, stats.sent, stats.failed
+
+    report = _("broadcaster.job_report", job_id=job_id, total=total, success=success, failure=failure)
     await context.bot.send_message(admin_id, report, parse_mode=ParseMode.HTML)
     from shared.keyboards import get_admin_main_menu_keyboard
     await context.bot.send_message(chat_id=admin_id, text=_("broadcaster.back_to_main"), reply_markup=get_admin_main_menu_keyboard())
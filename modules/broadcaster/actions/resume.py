@@ -0,0 +1,49 @@
+# FILE: modules/broadcaster/actions/resume.py
+
+import logging
+from telegram.ext import Application
+
+from database.crud import broadcast as crud_broadcast
+
+LOGGER = logging.getLogger(__name__)
+
+# Gives the bot time to finish starting before the resumed sends compete with it.
+RESUME_DELAY_SECONDS = 20
+
+
+def _build_job(broadcast):
+    """Returns the job callback and job data that continue the given broadcast, or (None, None)."""
+    content = broadcast.message_content or {}
+    base = {"admin_id": broadcast.admin_id, "broadcast_id": broadcast.broadcast_id}
+
+    if broadcast.kind == "builder":
+        from .main import send_broadcast_message_job
+        return send_broadcast_message_job, {**base, "message_content": content}
+    if broadcast.kind == "forward":
+        from .forwarder import forward_message_job
+        return forward_message_job, {**base, "from_chat_id": content.get("from_chat_id"), "message_id": content.get("message_id")}
+    if broadcast.kind == "gift":
+        from modules.financials.actions.gift import send_gift_notification_job
+        return send_gift_notification_job, {**base, "amount": content.get("amount", 0)}
+    return None, None
+
+
+async def resume_unfinished_broadcasts(application: Application) -> None:
+    """
+    Restarts every broadcast that was interrupted by a restart.
+
+    Called from post_init, before any update is handled, so every broadcast
+    still 'running' at this point belongs to a previous process and none that
+    an admin starts after boot is picked up twice.
+    """
+    broadcasts = await crud_broadcast.get_unfinished_broadcasts()
+    if not broadcasts or not application.job_queue:
+        return
+
+    for broadcast in broadcasts:
+        callback, data = _build_job(broadcast)
+        if callback is None:
+            LOGGER.error(f"Cannot resume broadcast {broadcast.broadcast_id}: unknown kind '{broadcast.kind}'.")
+            continue
+        LOGGER.info(f"Resuming interrupted {broadcast.kind} broadcast {broadcast.broadcast_id} in {RESUME_DELAY_SECONDS} seconds.")
+        application.job_queue.run_once(callback, RESUME_DELAY_SECONDS, data=data, name=f"broadcast_resume_{broadcast.broadcast_id}")
@@ -100,10 +100,12 @@ async def handle_my_service(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await loading_message.edit_text(_("customer.customer_service.no_valid_service_found"))
             return ConversationHandler.END
 
-        note_tasks = [crud_user_note.get_user_note(acc['username']) for acc in valid_accounts]
-        notes = await asyncio.gather(*note_tasks)
+        notes_map = await crud_user_note.get_user_notes_map(acc['username'] for acc in valid_accounts)
         
-        final_accounts = [acc for i, acc in enumerate(valid_accounts) if not (notes[i] and notes[i].is_test_account)]
+        final_accounts = [
+            acc for acc in valid_accounts
+            if not (notes_map.get(acc['username']) and notes_map[acc['username']].is_test_account)
+        ]
         
         if not final_accounts:
             await loading_message.edit_text(_("customer.customer_service.no_valid_service_found"))
@@ -1,7 +1,6 @@
 # --- START OF FILE modules/financials/actions/gift.py (REVISED) ---
 
 import logging
-import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
@@ -9,10 +8,12 @@ from telegram.constants import ParseMode
 # --- MODIFIED IMPORTS ---
 from database.crud import bot_setting as crud_bot_setting
 from database.crud import user as crud_user
+from database.crud import broadcast as crud_broadcast
 # --- ------------------ ---
 from shared.keyboards import get_gift_management_keyboard
 from shared.translator import _
 from shared.log_channel import send_log
+from shared.broadcast import run_broadcast, run_checkpointed_broadcast
 
 LOGGER = logging.getLogger(__name__)
 
@@ -112,7 +113,7 @@ async def process_universal_gift(update: Update, context: ContextTypes.DEFAULT_T
         user_ids = await crud_user.get_all_user_ids()
         
         context.job_queue.run_once(send_gift_notification_job, 1, 
-                           data={'user_ids': user_ids, 'amount': amount}, 
+                           data={'user_ids': user_ids, 'amount': amount, 'admin_id': update.effective_chat.id}, 
                            name=f"universal_gift_{update.effective_chat.id}")
         
         feedback = _("financials_gift.universal_gift_success_admin", count=affected_users_count)
@@ -133,21 +134,30 @@ async def process_universal_gift(update: Update, context: ContextTypes.DEFAULT_T
 
 async def send_gift_notification_job(context: ContextTypes.DEFAULT_TYPE):
     job_context = context.job.data
-    user_ids = job_context['user_ids']
     amount = job_context['amount']
+    admin_id = job_context.get('admin_id')
+    broadcast_id = job_context.get('broadcast_id')
     message = _("financials_gift.universal_gift_user_notification", amount=f"{amount:,}")
     
-    LOGGER.info(f"Starting universal gift notification job for {len(user_ids)} users.")
-    
-    sent_count = 0
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message)
-            sent_count += 1
-        except Exception as e:
-            LOGGER.warning(f"Failed to send gift notification to user {user_id}: {e}")
-        
-        await asyncio.sleep(0.1)
+    if broadcast_id is None:
+        user_ids = job_context['user_ids']
+        LOGGER.info(f"Starting universal gift notification job for {len(user_ids)} users.")
+        if admin_id is not None:
+            broadcast_id = await crud_broadcast.create_broadcast(admin_id, "gift", {'amount': amount}, user_ids)
+    else:
+        LOGGER.info(f"Resuming universal gift notification job (broadcast {broadcast_id}).")
+
+    if broadcast_id is not None:
+        stats = await run_checkpointed_broadcast(
+            context.bot, broadcast_id, context.bot.send_message, name=context.job.name,
+            status_chat_id=admin_id, text=message
+        )
+    else:
+        stats = await run_broadcast(
+            context.bot, user_ids, context.bot.send_message, name=context.job.name,
+            status_chat_id=admin_id, text=message
+        )
+    sent_count = stats.sent
 
     log_message = _("log.universal_gift_notification_finished", count=sent_count)
     await send_log(context.bot, log_message)
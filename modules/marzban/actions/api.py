@@ -4,32 +4,121 @@ import httpx
 import logging
 import datetime
 import asyncio # <-- کتابخانه جدید برای ایجاد تاخیر
-from typing import Tuple, Dict, Any, Optional, Union, List
-from .constants import GB_IN_BYTES
+import base64
+import json
+import time
+import collections
+import copy
+from typing import Tuple, Dict, Any, Optional, Union, List, AsyncIterator
+from .constants import (
+    GB_IN_BYTES, PANEL_USERS_PAGE_SIZE, PANEL_USERS_FETCH_CONCURRENCY, PANEL_DELETE_CONCURRENCY,
+    PANEL_MAX_CONCURRENT_REQUESTS, PANEL_BREAKER_FAILURE_THRESHOLD, PANEL_BREAKER_OPEN_SECONDS,
+    USER_DATA_CACHE_SECONDS
+)
 from database.crud import marzban_credential as crud_credential
+from database.crud import panel_user as crud_panel_user
 from .data_manager import normalize_username
+from . import user_snapshot
 
 LOGGER = logging.getLogger(__name__)
 _client = httpx.AsyncClient(timeout=20.0, http2=True)
 
 _marzban_credentials: Dict[str, Any] = {}
 
-async def init_marzban_credentials():
+def _decode_token_expiry(token: str) -> Optional[float]:
     """
-    اطلاعات اتصال به مرزبان را از دیتابیس خوانده و در حافظه کش می‌کند.
+    Reads the 'exp' claim from a JWT without verifying it.
+    Returns None if the token is not a decodable JWT or has no expiry.
     """
-    from .data_manager import load_marzban_credentials as load_from_db
-    global _marzban_credentials
-    _marzban_credentials = await load_from_db()
-    if _marzban_credentials:
-        LOGGER.info("Marzban credentials loaded into memory.")
-    else:
-        LOGGER.warning("Marzban credentials could not be loaded from database.")
+    try:
+        payload_segment = token.split('.')[1]
+        payload_segment += '=' * (-len(payload_segment) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(payload_segment))
+        exp = payload.get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
 
-async def get_marzban_token() -> Optional[str]:
+
+class _TokenManager:
+    """
+    Caches the Marzban admin bearer token in memory.
+    The token is refreshed shortly before it expires, and concurrent callers
+    share a single refresh instead of each hitting /api/admin/token. A failed
+    refresh is remembered briefly so the callers queued behind it give up at
+    once instead of each retrying the token endpoint.
     """
-    Gets an authentication token from the Marzban API.
-    Retries up to 3 times on network errors.
+    # Refresh this many seconds before the token's 'exp' claim.
+    REFRESH_MARGIN_SECONDS = 60
+    # Used when the panel returns a token whose expiry cannot be decoded.
+    FALLBACK_LIFETIME_SECONDS = 10 * 60
+    # After a failed refresh, get_token() returns None without fetching for this long.
+    FAILED_REFRESH_BACKOFF_SECONDS = 5
+
+    def __init__(self):
+        self._token: Optional[str] = None
+        self._expires_at: float = 0.0
+        self._failed_at: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - self.REFRESH_MARGIN_SECONDS
+
+    def _recently_failed(self) -> bool:
+        return time.monotonic() - self._failed_at < self.FAILED_REFRESH_BACKOFF_SECONDS
+
+    def reset(self) -> None:
+        """Drops the token and any failed-refresh backoff, e.g. after the credentials changed."""
+        self.invalidate()
+        self._failed_at = 0.0
+
+    def invalidate(self, stale_token: Optional[str] = None) -> None:
+        """
+        Drops the cached token. If `stale_token` is given, the cache is only
+        cleared when it still holds that token, so a burst of 401s for the
+        same token results in a single refresh.
+        """
+        if stale_token is None or stale_token == self._token:
+            self._token = None
+            self._expires_at = 0.0
+
+    async def get_token(self) -> Optional[str]:
+        if self._is_fresh():
+            return self._token
+        if self._recently_failed():
+            return None
+
+        async with self._lock:
+            # Another caller may have refreshed the token, or failed to, while we were waiting.
+            if self._is_fresh():
+                return self._token
+            if self._recently_failed():
+                return None
+
+            token = await _fetch_marzban_token()
+            if not token:
+                self.invalidate()
+                self._failed_at = time.monotonic()
+                return None
+
+            expires_at = _decode_token_expiry(token)
+            if expires_at is None:
+                expires_at = time.time() + self.FALLBACK_LIFETIME_SECONDS
+            self._token = token
+            self._expires_at = expires_at
+            self._failed_at = 0.0
+            LOGGER.debug(f"Marzban token refreshed; valid for {int(expires_at - time.time())} seconds.")
+            return token
+
+
+_token_manager = _TokenManager()
+
+
+async def _fetch_marzban_token() -> Optional[str]:
+    """
+    Requests a new authentication token from the Marzban API.
+    Retries up to 3 times on network errors, and reports every attempt to the
+    circuit breaker. Returns None at once while the circuit is open.
     """
     if not _marzban_credentials:
         LOGGER.warning("Marzban API call failed: Credentials are not loaded.")
@@ -48,11 +137,20 @@ async def get_marzban_token() -> Optional[str]:
     
     last_exception = None
     for attempt in range(3):
+        # Checked before every attempt: the circuit may open while we retry.
+        if _circuit_breaker.is_open:
+            _circuit_breaker.rejected += 1
+            LOGGER.warning(f"Skipping Marzban token request: the circuit is open. Last error: {last_exception}")
+            return None
         try:
             response = await _client.post(url, data=payload)
+            if response.status_code < 500:
+                _circuit_breaker.record_success()
             response.raise_for_status()
             return response.json().get("access_token")
         except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            if not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500:
+                _circuit_breaker.record_failure()
             last_exception = e
             LOGGER.warning(f"Attempt {attempt + 1}/3 to get Marzban token failed: {e}. Retrying in 1 second...")
             await asyncio.sleep(1)
@@ -60,10 +158,137 @@ async def get_marzban_token() -> Optional[str]:
     LOGGER.error(f"Failed to get Marzban token after 3 attempts. Last error: {last_exception}")
     return None
 
+async def get_marzban_token() -> Optional[str]:
+    """
+    Returns a valid authentication token for the Marzban API.
+    The token is served from memory and only re-requested when it is close to expiry.
+    """
+    return await _token_manager.get_token()
+
+class _PanelCircuitBreaker:
+    """
+    Stops sending requests to a panel that keeps failing.
+
+    After PANEL_BREAKER_FAILURE_THRESHOLD consecutive failed attempts the circuit
+    opens and requests fail immediately. After PANEL_BREAKER_OPEN_SECONDS one
+    probe request is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # Attempt outcomes kept for the error rate shown in the stats.
+    RECENT_WINDOW = 100
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._recent = collections.deque(maxlen=self.RECENT_WINDOW)
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= PANEL_BREAKER_OPEN_SECONDS:
+            self.state = self.HALF_OPEN
+            LOGGER.info("Marzban circuit half-open. Sending a probe request.")
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self._recent.append(True)
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            LOGGER.info("Marzban panel responded again. Circuit closed.")
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._recent.append(False)
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._consecutive_failures >= PANEL_BREAKER_FAILURE_THRESHOLD):
+            LOGGER.error(f"Marzban panel failed {self._consecutive_failures} times in a row. Circuit open for {PANEL_BREAKER_OPEN_SECONDS} seconds.")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Lets another request probe if this one ended without reaching the panel."""
+        self._probe_in_flight = False
+
+    def seconds_until_probe(self) -> int:
+        if self.state != self.OPEN:
+            return 0
+        return max(0, int(PANEL_BREAKER_OPEN_SECONDS - (time.monotonic() - self._opened_at)))
+
+    def error_rate(self) -> Tuple[float, int]:
+        """Share of failed attempts among the recent ones, and how many attempts that covers."""
+        if not self._recent:
+            return 0.0, 0
+        return self._recent.count(False) / len(self._recent), len(self._recent)
+
+
+_circuit_breaker = _PanelCircuitBreaker()
+_panel_limiter = asyncio.Semaphore(PANEL_MAX_CONCURRENT_REQUESTS)
+_in_flight = 0
+PANEL_UNAVAILABLE_ERROR = "Marzban panel is temporarily unavailable. Please try again shortly."
+
+
+def get_panel_stats() -> Dict[str, Any]:
+    """Circuit state, requests in flight and the recent error rate of panel API calls."""
+    error_rate, samples = _circuit_breaker.error_rate()
+    return {
+        "state": _circuit_breaker.state,
+        "retry_in_seconds": _circuit_breaker.seconds_until_probe(),
+        "in_flight": _in_flight,
+        "limit": PANEL_MAX_CONCURRENT_REQUESTS,
+        "error_rate": error_rate,
+        "samples": samples,
+        "rejected": _circuit_breaker.rejected,
+    }
+
+
 async def _api_request(method: str, endpoint: str, **kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Performs an API request to Marzban through the global concurrency limit and
+    the circuit breaker. While the circuit is open, it fails fast with an error
+    instead of contacting the panel.
+    """
+    global _in_flight
+    if not _circuit_breaker.allow_request():
+        return {"error": PANEL_UNAVAILABLE_ERROR}
+    is_probe = _circuit_breaker.state == _PanelCircuitBreaker.HALF_OPEN
+    try:
+        async with _panel_limiter:
+            # The circuit may have opened while this request waited for a slot.
+            if _circuit_breaker.is_open:
+                _circuit_breaker.rejected += 1
+                return {"error": PANEL_UNAVAILABLE_ERROR}
+            _in_flight += 1
+            try:
+                return await _send_api_request(method, endpoint, **kwargs)
+            finally:
+                _in_flight -= 1
+    finally:
+        if is_probe:
+            _circuit_breaker.release_probe()
+
+
+async def _send_api_request(method: str, endpoint: str, **kwargs) -> Optional[Dict[str, Any]]:
     """
     Performs an API request to Marzban with authentication and retry logic.
-    Retries up to 3 times for network-related errors or 5xx server errors.
+    Retries up to 3 times for network-related errors or 5xx server errors,
+    unless the circuit opened in the meantime.
+    A 401 response re-authenticates once and repeats the request.
     """
     token = await get_marzban_token()
     if not token:
@@ -71,17 +296,34 @@ async def _api_request(method: str, endpoint: str, **kwargs) -> Optional[Dict[st
     
     base_url = _marzban_credentials.get("base_url")
     url = f"{base_url}{endpoint}"
-    headers = {"Authorization": f"Bearer {token}", **kwargs.pop('headers', {})}
+    extra_headers = kwargs.pop('headers', {})
+    headers = {"Authorization": f"Bearer {token}", **extra_headers}
 
     last_exception = None
+    reauthenticated = False
     for attempt in range(3):
         try:
+            if attempt and _circuit_breaker.is_open:
+                break
             response = await _client.request(method, url, headers=headers, **kwargs)
+            if response.status_code < 500:
+                # Any answer below 500, including 4xx, means the panel itself is healthy.
+                _circuit_breaker.record_success()
             response.raise_for_status()
             return response.json() if response.content else {"success": True}
 
         except httpx.HTTPStatusError as e:
+            if e.response.status_code == 401 and not reauthenticated:
+                reauthenticated = True
+                LOGGER.info(f"Marzban rejected the cached token for {url}. Re-authenticating...")
+                _token_manager.invalidate(token)
+                token = await get_marzban_token()
+                if not token:
+                    return {"error": "Authentication failed or credentials not set."}
+                headers = {"Authorization": f"Bearer {token}", **extra_headers}
+                continue
             if 500 <= e.response.status_code < 600:
+                _circuit_breaker.record_failure()
                 last_exception = e
                 LOGGER.warning(f"API request to {url} failed with server error {e.response.status_code} (Attempt {attempt + 1}/3). Retrying...")
                 await asyncio.sleep(attempt + 1)
@@ -96,16 +338,129 @@ async def _api_request(method: str, endpoint: str, **kwargs) -> Optional[Dict[st
                 return {"error": error_detail, "status_code": e.response.status_code}
 
         except httpx.RequestError as e:
+            _circuit_breaker.record_failure()
             last_exception = e
             LOGGER.warning(f"Network error on API request to {url} (Attempt {attempt + 1}/3): {e}. Retrying...")
             await asyncio.sleep(attempt + 1)
     
+    if _circuit_breaker.is_open:
+        LOGGER.error(f"API request to {url} abandoned: the Marzban circuit is open. Last error: {last_exception}")
+        return {"error": PANEL_UNAVAILABLE_ERROR}
     LOGGER.error(f"API request to {url} failed after 3 attempts. Last error: {last_exception}")
     return {"error": "Network error or persistent server issue"}
 
+async def _remember_user(user: Dict[str, Any]) -> None:
+    """Stores a user returned by a write endpoint in the snapshot and the local mirror."""
+    if not isinstance(user, dict) or not user.get('username'):
+        return
+    _invalidate_user_data(user['username'])
+    user_snapshot.upsert_user(user)
+    await crud_panel_user.upsert_panel_users([crud_panel_user.panel_user_to_row(user)])
+
+
+async def _remember_user_fields(username: str, fields: Dict[str, Any]) -> None:
+    """Applies a partial change to one user in the snapshot and the local mirror."""
+    _invalidate_user_data(username)
+    user_snapshot.patch_user(username, fields)
+    await crud_panel_user.update_panel_user_fields(username, fields)
+
+
+async def _forget_user(username: str) -> None:
+    """Removes a deleted user from the snapshot and the local mirror."""
+    _invalidate_user_data(username)
+    user_snapshot.remove_user(username)
+    await crud_panel_user.delete_panel_users([username])
+
+
+class PanelUsersFetchError(Exception):
+    """Raised by iter_all_users when a page of users cannot be fetched from the panel."""
+
+
+async def _fetch_users_page(offset: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    # A fixed order keeps pages stable while we walk; new users are appended at the end.
+    params = {"offset": offset, "limit": limit, "sort": "created_at"}
+    response = await _api_request("GET", "/api/users", params=params, timeout=40.0)
+    if not response or "error" in response:
+        error = response.get("error") if response else "Network error"
+        raise PanelUsersFetchError(f"Failed to fetch users at offset {offset}: {error}")
+    return response.get("users") or [], response.get("total")
+
+
+async def iter_all_users(
+    page_size: int = PANEL_USERS_PAGE_SIZE,
+    concurrency: int = PANEL_USERS_FETCH_CONCURRENCY,
+    walk_info: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Walks the panel's user list with offset/limit and yields it page by page, in order.
+    Up to `concurrency` pages are requested ahead of the consumer, so memory use
+    depends on the page size rather than on the size of the panel.
+    If `walk_info` is given, the panel's reported total is stored in it under
+    'total' (None for panels that do not report one).
+    Raises PanelUsersFetchError if any page cannot be fetched.
+    """
+    seen_usernames = set()
+
+    def _new_users(page: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Users deleted while we page shift later offsets; skip repeats. Skipped users are
+        # possible too, which is why callers compare what they saw with the reported total.
+        fresh = []
+        for user in page:
+            username = user.get('username')
+            if username and username not in seen_usernames:
+                seen_usernames.add(username)
+                fresh.append(user)
+        return fresh
+
+    first_page, total = await _fetch_users_page(0, page_size)
+    if walk_info is not None:
+        walk_info['total'] = total
+    yield _new_users(first_page)
+
+    if total is None:
+        # Older panels do not report a total; page sequentially until a short page.
+        offset, page = page_size, first_page
+        while len(page) >= page_size:
+            page, _ = await _fetch_users_page(offset, page_size)
+            yield _new_users(page)
+            offset += page_size
+        return
+
+    offsets = iter(range(page_size, total, page_size))
+    pending: collections.deque = collections.deque()
+
+    def _schedule_next() -> None:
+        next_offset = next(offsets, None)
+        if next_offset is not None:
+            pending.append(asyncio.create_task(_fetch_users_page(next_offset, page_size)))
+
+    try:
+        for _ in range(max(1, concurrency)):
+            _schedule_next()
+        while pending:
+            page, _ = await pending.popleft()
+            _schedule_next()
+            yield _new_users(page)
+    finally:
+        for task in pending:
+            if task.done():
+                # Retrieve the result so a failed look-ahead page is not reported as unhandled.
+                if not task.cancelled():
+                    task.exception()
+            else:
+                task.cancel()
+
+
 async def get_all_users() -> Optional[List[Dict[str, Any]]]:
-    response = await _api_request("GET", "/api/users", timeout=40.0)
-    return response.get("users") if response and "error" not in response else None
+    """Returns every panel user as one list, or None if the panel could not be read."""
+    all_users: List[Dict[str, Any]] = []
+    try:
+        async for page in iter_all_users():
+            all_users.extend(page)
+    except PanelUsersFetchError as e:
+        LOGGER.error(f"Could not fetch the full user list from Marzban: {e}")
+        return None
+    return all_users
 
 async def init_marzban_credentials():
     """
@@ -114,6 +469,12 @@ async def init_marzban_credentials():
     global _marzban_credentials
     creds_obj = await crud_credential.load_marzban_credentials()
     
+    # Any cached token, failed-refresh backoff, user snapshot and mirror belong to the previous panel.
+    from . import panel_mirror
+    _token_manager.reset()
+    user_snapshot.invalidate()
+    panel_mirror.mark_stale()
+
     if creds_obj:
         _marzban_credentials = {
             "base_url": creds_obj.base_url,
@@ -125,18 +486,61 @@ async def init_marzban_credentials():
         _marzban_credentials = {}
         LOGGER.warning("Marzban credentials could not be loaded from database.")
 
-async def get_user_data(username: str) -> Optional[Dict[str, Any]]:
-    if not username: return None
+# get_user_data() results per username: (fetched_at, user), plus the fetch in progress for each username.
+_user_data_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_user_data_inflight: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+# Bumped on every invalidation so a fetch that started before a write is not cached afterwards.
+_user_data_generation: Dict[str, int] = collections.defaultdict(int)
+
+
+def _invalidate_user_data(username: str) -> None:
+    """Forgets the cached get_user_data() answer after the user was changed or deleted."""
+    _user_data_cache.pop(username, None)
+    _user_data_inflight.pop(username, None)
+    _user_data_generation[username] += 1
+
+
+async def _fetch_user_data(username: str) -> Optional[Dict[str, Any]]:
+    generation = _user_data_generation[username]
     response = await _api_request("GET", f"/api/user/{username}")
     # --- FIX: Simplify error handling. Let _api_request handle logging. ---
     if response and "error" in response:
         return None
+    if response and _user_data_generation[username] == generation:
+        _user_data_cache[username] = (time.monotonic(), response)
     return response
 
 
+async def get_user_data(username: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Returns one user from the panel. Concurrent calls for the same username share
+    a single GET, and the answer is reused for USER_DATA_CACHE_SECONDS unless the
+    user is modified, reset or deleted through the bot in the meantime.
+    Pass use_cache=False to always read the panel (the request is still shared).
+    Returns a copy, so callers may modify it.
+    """
+    if not username: return None
+    if use_cache:
+        cached = _user_data_cache.get(username)
+        if cached and time.monotonic() - cached[0] < USER_DATA_CACHE_SECONDS:
+            return copy.deepcopy(cached[1])
+
+    inflight = _user_data_inflight.get(username)
+    if inflight is None:
+        inflight = asyncio.ensure_future(_fetch_user_data(username))
+        _user_data_inflight[username] = inflight
+        inflight.add_done_callback(
+            lambda done, name=username: _user_data_inflight.pop(name, None) if _user_data_inflight.get(name) is done else None
+        )
+    # shield() keeps one caller's cancellation from cancelling the fetch for everyone else.
+    response = await asyncio.shield(inflight)
+    return copy.deepcopy(response) if response is not None else None
+
+
 
 async def modify_user_api(username: str, settings_to_change: dict) -> Tuple[bool, str]:
-    current_data = await get_user_data(username)
+    # The full user is sent back with PUT, so start from the panel's current state.
+    current_data = await get_user_data(username, use_cache=False)
     if not current_data or "error" in current_data:
         return False, f"User '{username}' not found or API error during fetch."
     
@@ -162,6 +566,10 @@ async def modify_user_api(username: str, settings_to_change: dict) -> Tuple[bool
     response = await _api_request("PUT", f"/api/user/{username}", json=updated_payload)
     
     if response and "error" not in response:
+        if response.get('username'):
+            await _remember_user(response)
+        else:
+            await _remember_user_fields(username, settings_to_change)
         return True, "User updated successfully."
     return False, response.get("error", "Unknown error") if response else "Network error"
 
@@ -169,19 +577,49 @@ async def modify_user_api(username: str, settings_to_change: dict) -> Tuple[bool
 async def delete_user_api(username: str) -> Tuple[bool, str]:
     response = await _api_request("DELETE", f"/api/user/{username}")
     if response and "error" not in response:
+        await _forget_user(username)
         return True, "User deleted successfully."
     return False, response.get("error", "Unknown error") if response else "Network error"
 
+async def delete_users_api(usernames: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Deletes many users from the panel with at most PANEL_DELETE_CONCURRENCY
+    requests in flight. Returns the deleted usernames and an error per failed one.
+    """
+    semaphore = asyncio.Semaphore(PANEL_DELETE_CONCURRENCY)
+
+    async def _delete(username: str) -> Optional[str]:
+        async with semaphore:
+            response = await _api_request("DELETE", f"/api/user/{username}")
+        if response and "error" not in response:
+            return None
+        return response.get("error", "Unknown error") if response else "Network error"
+
+    results = await asyncio.gather(*(_delete(username) for username in usernames))
+    deleted = [username for username, error in zip(usernames, results) if error is None]
+    failed = {username: error for username, error in zip(usernames, results) if error is not None}
+
+    for username in deleted:
+        _invalidate_user_data(username)
+        user_snapshot.remove_user(username)
+    await crud_panel_user.delete_panel_users(deleted)
+    return deleted, failed
+
 async def create_user_api(payload: dict) -> Tuple[bool, Union[str, Dict[str, Any]]]:
     if 'username' in payload: payload['username'] = normalize_username(payload['username'])
     response = await _api_request("POST", "/api/user", json=payload)
     if response and "error" not in response:
+        await _remember_user(response)
         return True, response
     return False, response.get("error", "Unknown error") if response else "Network error"
 
 async def reset_user_traffic_api(username: str) -> Tuple[bool, str]:
     response = await _api_request("POST", f"/api/user/{username}/reset")
     if response and "error" not in response:
+        if response.get('username'):
+            await _remember_user(response)
+        else:
+            await _remember_user_fields(username, {'used_traffic': 0})
         return True, "Traffic reset successfully."
     return False, response.get("error", "Unknown error") if response else "Network error"
 
@@ -189,6 +627,7 @@ async def reset_subscription_url_api(username: str) -> Tuple[bool, Union[str, Di
     normalized_user = normalize_username(username)
     response = await _api_request("POST", f"/api/user/{normalized_user}/revoke_sub")
     if response and "error" not in response:
+        await _remember_user(response)
         return True, response
     return False, response.get("error", "Unknown error") if response else "Network error"
 
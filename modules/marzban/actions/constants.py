@@ -28,6 +28,17 @@ SET_TEMPLATE_USER_PROMPT = 8
 # ===== PAGINATION =====
 USERS_PER_PAGE = 12 # Number of users to show on each page of the user list
 
+# ===== PANEL USER FETCHING =====
+PANEL_USERS_PAGE_SIZE = 500 # Users requested per GET /api/users page
+PANEL_USERS_FETCH_CONCURRENCY = 4 # Pages requested from the panel at the same time
+PANEL_DELETE_CONCURRENCY = 8 # DELETE /api/user requests in flight during bulk deletes
+
+# ===== PANEL PROTECTION =====
+PANEL_MAX_CONCURRENT_REQUESTS = 10 # Panel API requests in flight across the whole bot
+PANEL_BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failed attempts (network or 5xx) that open the circuit
+PANEL_BREAKER_OPEN_SECONDS = 30 # Requests fail fast for this long before one probe request is let through
+USER_DATA_CACHE_SECONDS = 5 # get_user_data() answers are reused this long unless the user is changed through the bot
+
 # ===== DATA CONVERSION =====
 GB_IN_BYTES = 1024 * 1024 * 1024 # 1 Gigabyte in bytes
 
@@ -1,6 +1,6 @@
 # --- START OF FILE modules/marzban/actions/data_manager.py ---
 import logging
-from typing import Dict
+from typing import Dict, Iterable
 
 from config import config
 from database.crud import (
@@ -46,6 +46,13 @@ async def cleanup_marzban_user_data(marzban_username: str) -> bool:
     )
 
 
+async def cleanup_marzban_users_bulk(marzban_usernames: Iterable[str]) -> bool:
+    """Wrapper for crud.actions.cleanup_marzban_users_bulk with normalized usernames."""
+    return await crud_actions.cleanup_marzban_users_bulk(
+        normalize_username(username) for username in marzban_usernames
+    )
+
+
 async def load_users_map() -> Dict[str, int]:
     """
     Loads a dictionary mapping Marzban usernames to Telegram user IDs.
@@ -7,6 +7,7 @@ import math
 import datetime
 import jdatetime
 import logging
+from typing import Optional
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -17,7 +18,9 @@ from shared.keyboards import get_user_management_keyboard
 # --- MODIFIED: Import new callback type ---
 from shared.callback_types import StartManualInvoice
 from .constants import USERS_PER_PAGE, GB_IN_BYTES
-from .api import get_all_users, get_user_data
+from .api import get_user_data
+from . import user_snapshot
+from . import user_status
 from modules.general.actions import start as show_main_menu_action
 from shared.auth import admin_only
 
@@ -30,100 +33,56 @@ def get_user_display_info(user: dict) -> tuple[str, str, bool, str, str]:
     from shared.translator import get as get_text
     username = user.get('username', 'N/A')
     sanitized_username = username.replace('`', '')
-    
-    status = user.get('status', 'disabled')
-    used_traffic = user.get('used_traffic') or 0
-    data_limit = user.get('data_limit') or 0
-    expire_timestamp = user.get('expire')
-    online_at = user.get('online_at')
-
-    prefix = get_text("marzban.marzban_display.status_active")
-    is_online = False
+
+    table = user_status.classify([user])
+    row = table.row(username)
+    if row is None:
+        return get_text("marzban.marzban_display.status_inactive"), sanitized_username, False, get_text("marzban.marzban_display.expired"), get_text("marzban.marzban_display.infinite")
+
+    is_online = table.is_online[row]
     days_left_str = get_text("marzban.marzban_display.infinite")
     data_left_str = get_text("marzban.marzban_display.infinite")
 
-    if online_at:
-        try:
-            online_at_dt = datetime.datetime.fromisoformat(online_at.replace("Z", "+00:00"))
-            if (datetime.datetime.now(datetime.timezone.utc) - online_at_dt).total_seconds() < 180:
-                is_online = True
-                prefix = get_text("marzban.marzban_display.status_online")
-        except (ValueError, TypeError): pass
-
-    if status != 'active' or (expire_timestamp and datetime.datetime.fromtimestamp(expire_timestamp) < datetime.datetime.now()):
+    if table.is_expired[row]:
         prefix = get_text("marzban.marzban_display.status_inactive")
         days_left_str = get_text("marzban.marzban_display.expired")
     else:
-        is_warning = False
-        if expire_timestamp:
-            time_left = datetime.datetime.fromtimestamp(expire_timestamp) - datetime.datetime.now()
-            days_left_val = time_left.days + (1 if time_left.seconds > 0 else 0)
-            days_left_str = get_text("marzban.marzban_display.days_left", days=days_left_val)
-            if 0 < days_left_val <= 3:
-                is_warning = True
-        
-        if data_limit > 0:
-            data_left_gb = (data_limit - used_traffic) / GB_IN_BYTES
-            data_left_str = get_text("marzban.marzban_display.data_left_gb", gb=data_left_gb)
-            if data_left_gb < 1:
-                is_warning = True
-        
-        if is_warning and not is_online:
+        if table.seconds_left[row] is not None:
+            days_left_str = get_text("marzban.marzban_display.days_left", days=table.days_left(username))
+        if table.data_left_bytes[row] is not None:
+            data_left_str = get_text("marzban.marzban_display.data_left_gb", gb=table.data_left_bytes[row] / GB_IN_BYTES)
+
+        if is_online:
+            prefix = get_text("marzban.marzban_display.status_online")
+        elif table.is_warning[row]:
             prefix = get_text("marzban.marzban_display.status_warning")
+        else:
+            prefix = get_text("marzban.marzban_display.status_active")
             
     return prefix, sanitized_username, is_online, days_left_str, data_left_str
 
-# ----------------- START OF MODIFIED CODE -----------------
-
-# ----------------- START OF FINAL CODE -----------------
-def _get_status_emoji(user: dict) -> str:
-    """Determines the correct status emoji for a user based on their state."""
-    # This check for 'unused' status has the highest priority after online status
-    used_traffic = user.get('used_traffic') or 0
-    if used_traffic == 0:
-        return "🟣" # Unused user
-        
-    online_at = user.get('online_at')
-    if online_at:
-        try:
-            online_at_dt = datetime.datetime.strptime(online_at, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=datetime.timezone.utc)
-            if (datetime.datetime.now(datetime.timezone.utc) - online_at_dt).total_seconds() < 180:
-                return "🟢" # Online user
-        except (ValueError, TypeError):
-            pass
 
-    status = user.get('status', 'disabled')
-    expire_timestamp = user.get('expire')
-
-    if status != 'active' or (expire_timestamp and datetime.datetime.fromtimestamp(expire_timestamp) < datetime.datetime.now()):
-        return "🔴" # Expired/Disabled user
-
-    is_warning = False
-    if expire_timestamp:
-        days_left_val = (datetime.datetime.fromtimestamp(expire_timestamp) - datetime.datetime.now()).days
-        if 0 <= days_left_val <= 3:
-            is_warning = True
-    
-        data_limit = user.get('data_limit') or 0
-    if data_limit > 0:
-        data_left_gb = (data_limit - used_traffic) / GB_IN_BYTES
-        if data_left_gb < 1:
-            is_warning = True
-            
-    if is_warning:
-        return "🟡" # Warning user
-        
-    return "⚪️" # Offline but active user
+def _get_status_emoji(user: dict, status_table: Optional[user_status.UserStatusTable] = None) -> str:
+    """Returns the status emoji for a user, preferring a precomputed classification."""
+    status = status_table.status_of(user.get('username')) if status_table is not None else None
+    if status is None:
+        status = user_status.classify([user]).status_of(user.get('username')) or user_status.EXPIRED
+    return user_status.STATUS_EMOJI[status]
 
 
-def build_users_keyboard(users: list, current_page: int, total_pages: int, list_type: str) -> InlineKeyboardMarkup:
-    """Builds a modern, three-column keyboard with a legend button."""
+def build_users_keyboard(users: list, current_page: int, total_pages: int, list_type: str, status_table: Optional[user_status.UserStatusTable] = None) -> InlineKeyboardMarkup:
+    """
+    Builds a modern, three-column keyboard with a legend button.
+    Pass the panel-wide status_table when available; otherwise only this page is classified.
+    """
     keyboard_rows = []
+    if status_table is None:
+        status_table = user_status.classify(users)
     
     for i in range(0, len(users), 3):
         row = [
             InlineKeyboardButton(
-                f"{_get_status_emoji(user)} {user.get('username', 'N/A')}",
+                f"{_get_status_emoji(user, status_table)} {user.get('username', 'N/A')}",
                 callback_data=f"user_details_{user.get('username')}_{list_type}_{current_page}"
             ) for user in users[i : i + 3]
         ]
@@ -145,7 +104,10 @@ def build_users_keyboard(users: list, current_page: int, total_pages: int, list_
     if nav_row:
         keyboard_rows.append(nav_row)
         
-    keyboard_rows.append([InlineKeyboardButton("✖️ بستن", callback_data="close_pagination")])
+    keyboard_rows.append([
+        InlineKeyboardButton("🔄 بروزرسانی", callback_data=f"refresh_users_{list_type}"),
+        InlineKeyboardButton("✖️ بستن", callback_data="close_pagination")
+    ])
     
     return InlineKeyboardMarkup(keyboard_rows)
 
@@ -169,45 +131,72 @@ async def show_user_management_menu(update: Update, context: ContextTypes.DEFAUL
     from shared.translator import get as get_text
     await update.message.reply_text(get_text("marzban.marzban_display.user_management_section"), reply_markup=get_user_management_keyboard())
 
+# Per-admin cached list views in context.user_data: {list_type: {'version', 'users', 'query'}}.
+# A view is reused while the user snapshot version it was built from is current.
+_USER_LIST_VIEWS_KEY = 'user_list_views'
+
+
+def store_user_list_view(context: ContextTypes.DEFAULT_TYPE, list_type: str, users: list, query: str = None) -> None:
+    """Stores a sorted/filtered user list so later page flips only slice it."""
+    views = context.user_data.setdefault(_USER_LIST_VIEWS_KEY, {})
+    views[list_type] = {'version': user_snapshot.get_version(), 'users': users, 'query': query}
+
+
+def _get_current_view(context: ContextTypes.DEFAULT_TYPE, list_type: str) -> Optional[list]:
+    view = context.user_data.get(_USER_LIST_VIEWS_KEY, {}).get(list_type)
+    if view and view['version'] == user_snapshot.get_version():
+        return view['users']
+    return None
+
+
+async def _build_user_list_view(context: ContextTypes.DEFAULT_TYPE, list_type: str) -> Optional[list]:
+    """Rebuilds one list view from the snapshot. Returns None if the panel is unreachable."""
+    all_users = await user_snapshot.get_users()
+    if all_users is None:
+        return None
+
+    if list_type == 'search':
+        from . import search_index
+        query = context.user_data.get(_USER_LIST_VIEWS_KEY, {}).get('search', {}).get('query')
+        users = (await search_index.search(query) or []) if query else []
+        store_user_list_view(context, 'search', users, query=query)
+        return users
+
+    if list_type == 'warning':
+        status_table = await user_status.get_status_table() or user_status.classify(all_users)
+        all_users = [u for u in all_users if status_table.needs_attention(u.get('username'))]
+    users = sorted(all_users, key=lambda u: u.get('username','').lower())
+    store_user_list_view(context, list_type, users)
+    return users
+
+
 async def _list_users_base(update: Update, context: ContextTypes.DEFAULT_TYPE, list_type: str, page: int = 1):
     from shared.translator import get as get_text
     is_callback = update.callback_query is not None
     message = update.callback_query.message if is_callback else await update.message.reply_text(get_text("marzban.marzban_display.loading"))
     
-    if list_type != 'search':
-        context.user_data.pop('last_search_results', None)
-    
     if is_callback:
         await update.callback_query.answer()
-    else:
-        await message.edit_text(get_text("marzban.marzban_display.fetching_users"))
-    
-    target_users = []
     
     try:
         if list_type == 'search':
             title_text = get_text("marzban.marzban_display.search_results_title")
             not_found_text = get_text("marzban.marzban_display.no_search_results")
-            target_users = context.user_data.get('last_search_results', [])
         else:
             title_text = get_text("marzban.marzban_display.warning_list_title") if list_type == 'warning' else get_text("marzban.marzban_display.all_users_list_title")
             not_found_text = get_text("marzban.marzban_display.no_warning_users") if list_type == 'warning' else get_text("marzban.marzban_display.no_users_in_panel")
-            
-            all_users = await get_all_users()
-            if all_users is None:
+
+        if not is_callback:
+            # Opening a list from the menu honours the snapshot TTL; page flips reuse the cached view.
+            await user_snapshot.get_users()
+
+        target_users = _get_current_view(context, list_type)
+        if target_users is None:
+            if not is_callback:
+                await message.edit_text(get_text("marzban.marzban_display.fetching_users"))
+            target_users = await _build_user_list_view(context, list_type)
+            if target_users is None:
                 await message.edit_text(get_text("marzban.marzban_display.panel_connection_error")); return
-            
-            if list_type == 'warning':
-                warning_users = []
-                warning_status = get_text("marzban.marzban_display.status_warning")
-                inactive_status = get_text("marzban.marzban_display.status_inactive")
-                for u in all_users:
-                    prefix, _, is_online, _, _ = get_user_display_info(u)
-                    if not is_online and prefix in [warning_status, inactive_status]:
-                        warning_users.append(u)
-                target_users = sorted(warning_users, key=lambda u: u.get('username','').lower())
-            else:
-                target_users = sorted(all_users, key=lambda u: u.get('username','').lower())
 
         if not target_users:
             await message.edit_text(not_found_text); return
@@ -217,7 +206,9 @@ async def _list_users_base(update: Update, context: ContextTypes.DEFAULT_TYPE, l
         start_index = (page - 1) * USERS_PER_PAGE
         page_users = target_users[start_index : start_index + USERS_PER_PAGE]
         
-        keyboard = build_users_keyboard(page_users, page, total_pages, list_type)
+        # Page flips must never refresh the snapshot, so they only reuse a table that is already built.
+        status_table = user_status.get_cached_status_table() if is_callback else await user_status.get_status_table()
+        keyboard = build_users_keyboard(page_users, page, total_pages, list_type, status_table=status_table)
         safe_title = escape_markdown(get_text("marzban.marzban_display.page_title", title=title_text, page=page), version=2)
         await message.edit_text(safe_title, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN_V2)
 
@@ -237,6 +228,15 @@ async def list_warning_users_paginated(update: Update, context: ContextTypes.DEF
 async def update_user_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await _list_users_base(update, context, list_type=update.callback_query.data.split('_')[-2], page=int(update.callback_query.data.split('_')[-1]))
 
+@admin_only
+async def refresh_user_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drops the cached list views, re-reads the panel users and shows page 1 again."""
+    list_type = update.callback_query.data[len("refresh_users_"):]
+    await user_snapshot.get_users(force_refresh=True)
+    for view in context.user_data.get(_USER_LIST_VIEWS_KEY, {}).values():
+        view['version'] = -1
+    await _list_users_base(update, context, list_type=list_type, page=1)
+
 async def show_user_details_panel(context: ContextTypes.DEFAULT_TYPE, chat_id: int, username: str, list_type: str, page_number: int, success_message: str = None, message_id: int = None) -> None:
     from shared.translator import get as get_text
     user_info = await get_user_data(username)
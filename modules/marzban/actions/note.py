@@ -10,7 +10,7 @@ from telegram.helpers import escape_markdown
 from .data_manager import normalize_username
 from shared.keyboards import get_user_management_keyboard
 from shared.callbacks import end_conversation_and_show_menu # <--- وارد کردن تابع
-from .api import get_all_users as get_all_marzban_users
+from . import user_snapshot
 from database.crud import user_note as crud_user_note
 
 LOGGER = logging.getLogger(__name__)
@@ -136,7 +136,7 @@ async def list_users_with_subscriptions(update: Update, context: ContextTypes.DE
         message_to_edit = await update.message.reply_text(_("marzban.marzban_note.loading_subscriptions"))
 
     all_notes_obj = await crud_user_note.get_all_users_with_notes()
-    marzban_users = await get_all_marzban_users()
+    marzban_users = await user_snapshot.get_users()
     
     if marzban_users is None:
         await message_to_edit.edit_text(_("marzban.marzban_display.panel_connection_error")); return
@@ -0,0 +1,112 @@
+# --- START OF FILE modules/marzban/actions/panel_mirror.py ---
+"""
+Keeps the local `panel_users` table in sync with the Marzban panel.
+
+A repeating job walks the panel's user list and writes only the rows whose
+content hash changed, then removes users that no longer exist on the panel.
+Listing, search and the daily jobs read from the mirror while it is fresh and
+fall back to the live panel when it is not.
+"""
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from telegram.ext import ContextTypes
+
+from config import config
+from database.crud import panel_user as crud_panel_user
+from .api import iter_all_users, PanelUsersFetchError
+from . import user_snapshot
+
+LOGGER = logging.getLogger(__name__)
+
+# The mirror is trusted for this many sync intervals after the last successful sync.
+_STALE_AFTER_INTERVALS = 3
+
+_last_synced_at: Optional[float] = None
+
+
+def is_fresh() -> bool:
+    """True if the last successful sync is recent enough for readers to rely on the mirror."""
+    if _last_synced_at is None:
+        return False
+    return (time.monotonic() - _last_synced_at) < config.PANEL_MIRROR_SYNC_INTERVAL * _STALE_AFTER_INTERVALS
+
+
+def mark_stale() -> None:
+    """Stops readers from using the mirror until the next successful sync (e.g. after a panel change)."""
+    global _last_synced_at
+    _last_synced_at = None
+
+
+async def sync_panel_users_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback that diff-syncs the panel's users into the mirror table."""
+    await sync_panel_users()
+
+
+async def sync_panel_users() -> bool:
+    global _last_synced_at
+
+    started_at = time.monotonic()
+    stored_hashes = await crud_panel_user.get_row_hashes()
+    seen_usernames = set()
+    changed_count = 0
+    walk_info: Dict[str, Any] = {}
+
+    try:
+        async for page in iter_all_users(walk_info=walk_info):
+            changed_rows = []
+            for user in page:
+                row = crud_panel_user.panel_user_to_row(user)
+                seen_usernames.add(row['username'])
+                if stored_hashes.get(row['username']) != row['row_hash']:
+                    changed_rows.append(row)
+            if changed_rows:
+                if not await crud_panel_user.upsert_panel_users(changed_rows):
+                    return False
+                changed_count += len(changed_rows)
+    except PanelUsersFetchError as e:
+        LOGGER.warning(f"Panel mirror sync aborted: {e}")
+        return False
+
+    # Only a complete walk tells us which users were removed from the panel. If users were
+    # deleted while we paged, offsets shifted and some users may have been skipped, so
+    # pruning waits for the next sync rather than dropping rows of users that still exist.
+    total = walk_info.get('total')
+    removed_count = 0
+    if total is None or len(seen_usernames) >= total:
+        removed_usernames = [username for username in stored_hashes if username not in seen_usernames]
+        removed_count = await crud_panel_user.delete_panel_users(removed_usernames)
+    else:
+        LOGGER.info(f"Panel mirror sync saw {len(seen_usernames)} of {total} users; skipping removal of missing rows this time.")
+
+    _last_synced_at = time.monotonic()
+    if changed_count or removed_count:
+        user_snapshot.invalidate()
+    LOGGER.info(
+        f"Panel mirror synced in {_last_synced_at - started_at:.1f}s: "
+        f"{len(seen_usernames)} users, {changed_count} changed, {removed_count} removed."
+    )
+    return True
+
+
+async def load_users() -> Optional[List[Dict[str, Any]]]:
+    """Returns all users from the mirror, or None if the mirror is not fresh."""
+    if not is_fresh():
+        return None
+    return await crud_panel_user.get_all_panel_users()
+
+
+async def iter_users() -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yields all users page by page, from the mirror when it is fresh and from the
+    live panel otherwise. Raises PanelUsersFetchError if the panel cannot be read.
+    """
+    if is_fresh():
+        async for batch in crud_panel_user.iter_panel_users():
+            yield batch
+        return
+    async for page in iter_all_users():
+        yield page
+
+# --- END OF FILE modules/marzban/actions/panel_mirror.py ---
@@ -5,8 +5,9 @@ from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 
 from .constants import SEARCH_PROMPT, USERS_PER_PAGE
-from .api import get_all_users
-from .display import build_users_keyboard
+from . import search_index
+from . import user_status
+from .display import build_users_keyboard, store_user_list_view
 from shared.keyboards import get_user_management_keyboard
 from .data_manager import normalize_username
 
@@ -22,23 +23,14 @@ async def prompt_for_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def search_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     from shared.translator import _
-    search_query = normalize_username(update.message.text)
-    context.user_data.pop('last_search_results', None)
+    search_query = normalize_username(update.message.text.strip())
     
     await update.message.reply_text(_("marzban_search.searching_for", query=f"«{search_query}»"))
 
-    all_users = await get_all_users()
-    if all_users is None:
+    found_users = await search_index.search(search_query)
+    if found_users is None:
         await update.message.reply_text(_("marzban_display.panel_connection_error"), reply_markup=get_user_management_keyboard())
         return ConversationHandler.END
-    if not all_users:
-        await update.message.reply_text(_("marzban_display.no_users_in_panel"), reply_markup=get_user_management_keyboard())
-        return ConversationHandler.END
-
-    found_users = sorted(
-        [user for user in all_users if user.get('username') and search_query in normalize_username(user['username'])],
-        key=lambda u: u['username'].lower()
-    )
 
     if not found_users:
         await update.message.reply_text(
@@ -47,12 +39,13 @@ async def search_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         )
         return ConversationHandler.END
 
-    context.user_data['last_search_results'] = found_users
+    store_user_list_view(context, 'search', found_users, query=search_query)
     
     total_pages = math.ceil(len(found_users) / USERS_PER_PAGE)
     page_users = found_users[:USERS_PER_PAGE]
     
-    keyboard = build_users_keyboard(users=page_users, current_page=1, total_pages=total_pages, list_type='search')
+    # search_index.search() already read the snapshot; do not risk a second fetch for the emojis.
+    keyboard = build_users_keyboard(users=page_users, current_page=1, total_pages=total_pages, list_type='search', status_table=user_status.get_cached_status_table())
     
     await update.message.reply_text(_("marzban_search.search_results_title", query=f"«{search_query}»"), reply_markup=keyboard)
     return ConversationHandler.END
\ No newline at end of file
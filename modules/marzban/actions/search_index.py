@@ -0,0 +1,239 @@
+# --- START OF FILE modules/marzban/actions/search_index.py ---
+"""
+In-memory search index over the panel user snapshot.
+
+Usernames are kept in a sorted list for prefix lookups and in an n-gram index
+(all 1-, 2- and 3-character substrings) for substring lookups, so a search
+never scans the whole panel. Users can also be found by their linked Telegram
+ID and by the text of their admin note.
+
+The username part follows the snapshot: creates and deletes are applied one by
+one through user_added()/user_removed(), and after a full snapshot refresh only
+the difference is applied. Links and notes live in the database and are
+reloaded at most once per PANEL_USERS_CACHE_TTL.
+"""
+import bisect
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from config import config
+from . import user_snapshot
+from .data_manager import normalize_username
+
+LOGGER = logging.getLogger(__name__)
+
+# Queries up to this length are answered directly from the n-gram postings;
+# longer ones intersect the postings of their trigrams and verify the candidates.
+_MAX_GRAM = 3
+
+
+def _grams(text: str, max_len: int = _MAX_GRAM) -> Set[str]:
+    return {text[i:i + n] for n in range(1, max_len + 1) for i in range(len(text) - n + 1)}
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + _MAX_GRAM] for i in range(len(text) - _MAX_GRAM + 1)}
+
+
+class UserSearchIndex:
+    """Username, Telegram ID and note lookups; every method returns usernames."""
+
+    def __init__(self):
+        self._sorted_names: List[str] = []
+        self._display_names: Dict[str, str] = {}
+        self._name_grams: Dict[str, Set[str]] = defaultdict(set)
+        self._by_telegram_id: Dict[int, Set[str]] = defaultdict(set)
+        self._note_texts: Dict[str, str] = {}
+        self._note_grams: Dict[str, Set[str]] = defaultdict(set)
+        self.side_data_loaded_at: float = 0.0
+
+    @property
+    def usernames(self) -> Set[str]:
+        return set(self._display_names.values())
+
+    def add_username(self, username: str) -> None:
+        key = normalize_username(username)
+        if key in self._display_names:
+            return
+        self._display_names[key] = username
+        bisect.insort(self._sorted_names, key)
+        for gram in _grams(key):
+            self._name_grams[gram].add(key)
+
+    def remove_username(self, username: str) -> None:
+        key = normalize_username(username)
+        if self._display_names.pop(key, None) is None:
+            return
+        i = bisect.bisect_left(self._sorted_names, key)
+        if i < len(self._sorted_names) and self._sorted_names[i] == key:
+            del self._sorted_names[i]
+        for gram in _grams(key):
+            postings = self._name_grams.get(gram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._name_grams[gram]
+
+    def set_side_data(self, links: Dict[str, int], notes: Dict[str, str]) -> None:
+        """Replaces the Telegram ID and note lookups."""
+        by_telegram_id: Dict[int, Set[str]] = defaultdict(set)
+        for username, telegram_id in links.items():
+            by_telegram_id[telegram_id].add(username)
+
+        note_texts: Dict[str, str] = {}
+        note_grams: Dict[str, Set[str]] = defaultdict(set)
+        for username, text in notes.items():
+            if not text:
+                continue
+            text = text.lower()
+            note_texts[username] = text
+            for gram in _trigrams(text):
+                note_grams[gram].add(username)
+
+        self._by_telegram_id, self._note_texts, self._note_grams = by_telegram_id, note_texts, note_grams
+        self.side_data_loaded_at = time.monotonic()
+
+    def prefix(self, query: str) -> List[str]:
+        """Usernames starting with the query, in sorted order."""
+        key = normalize_username(query)
+        start = bisect.bisect_left(self._sorted_names, key)
+        end = bisect.bisect_left(self._sorted_names, key + "\uffff", lo=start)
+        return [self._display_names[k] for k in self._sorted_names[start:end]]
+
+    def substring(self, query: str) -> Set[str]:
+        """Usernames containing the query anywhere."""
+        key = normalize_username(query)
+        if not key:
+            return set()
+        if len(key) <= _MAX_GRAM:
+            keys = self._name_grams.get(key, set())
+        else:
+            keys = self._verified(key, self._name_grams, lambda k: k)
+        return {self._display_names[k] for k in keys}
+
+    def by_telegram_id(self, telegram_id: int) -> Set[str]:
+        return set(self._by_telegram_id.get(telegram_id, ()))
+
+    def note_contains(self, query: str) -> Set[str]:
+        """Usernames whose note contains the query; queries shorter than a trigram are not matched."""
+        key = query.lower()
+        if len(key) < _MAX_GRAM:
+            return set()
+        return self._verified(key, self._note_grams, self._note_texts.get)
+
+    @staticmethod
+    def _verified(key: str, postings: Dict[str, Set[str]], text_of) -> Set[str]:
+        gram_sets = []
+        for gram in _trigrams(key):
+            found = postings.get(gram)
+            if not found:
+                return set()
+            gram_sets.append(found)
+        gram_sets.sort(key=len)
+        candidates = gram_sets[0].intersection(*gram_sets[1:])
+        return {c for c in candidates if key in (text_of(c) or "")}
+
+    def search(self, query: str) -> List[str]:
+        """
+        All matches for a query: exact and prefix username matches first,
+        then other username matches, then Telegram ID and note matches.
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        ordered = self.prefix(query)
+        seen = set(ordered)
+        ordered += sorted(self.substring(query) - seen, key=str.lower)
+        seen.update(ordered)
+
+        extra: Set[str] = set()
+        if query.isdigit():
+            extra |= self.by_telegram_id(int(query))
+        extra |= self.note_contains(query)
+        ordered += sorted(extra - seen, key=str.lower)
+        return ordered
+
+
+_index: Optional[UserSearchIndex] = None
+_synced_version: int = -1
+
+
+def _sync_with_snapshot(users: List[dict]) -> UserSearchIndex:
+    """Builds the index on first use; afterwards applies only the added/removed usernames."""
+    global _index, _synced_version
+
+    version = user_snapshot.get_version()
+    if _index is not None and _synced_version == version:
+        return _index
+
+    if _index is None:
+        _index = UserSearchIndex()
+    current = {u['username'] for u in users if u.get('username')}
+    indexed = _index.usernames
+    for username in indexed - current:
+        _index.remove_username(username)
+    for username in current - indexed:
+        _index.add_username(username)
+    _synced_version = version
+    return _index
+
+
+async def _refresh_side_data(index: UserSearchIndex) -> None:
+    from database.crud import marzban_link as crud_marzban_link, user_note as crud_user_note
+    try:
+        links = await crud_marzban_link.get_all_marzban_links_map()
+        notes = await crud_user_note.get_user_notes_map()
+    except Exception as e:
+        LOGGER.error(f"Could not load links and notes for the search index: {e}", exc_info=True)
+        # Retry after the next TTL instead of on every search.
+        index.side_data_loaded_at = time.monotonic()
+        return
+    index.set_side_data(links, {username: note.note for username, note in notes.items()})
+
+
+async def search(query: str) -> Optional[List[dict]]:
+    """
+    Returns the snapshot entries matching a username fragment, a Telegram ID
+    or note text, best matches first. Returns None if the user list is unavailable.
+    """
+    users = await user_snapshot.get_users()
+    if users is None:
+        return None
+
+    index = _sync_with_snapshot(users)
+    if time.monotonic() - index.side_data_loaded_at >= config.PANEL_USERS_CACHE_TTL:
+        await _refresh_side_data(index)
+
+    found = []
+    for username in index.search(query):
+        user = user_snapshot.get_cached_user(username)
+        if user is not None:
+            found.append(user)
+    return found
+
+
+def user_added(username: str) -> None:
+    """Called by the snapshot after a new user was inserted."""
+    global _synced_version
+    if _index is None:
+        return
+    was_in_sync = _synced_version == user_snapshot.get_version() - 1
+    _index.add_username(username)
+    if was_in_sync:
+        _synced_version = user_snapshot.get_version()
+
+
+def user_removed(username: str) -> None:
+    """Called by the snapshot after a user was removed."""
+    global _synced_version
+    if _index is None:
+        return
+    was_in_sync = _synced_version == user_snapshot.get_version() - 1
+    _index.remove_username(username)
+    if was_in_sync:
+        _synced_version = user_snapshot.get_version()
+
+# --- END OF FILE modules/marzban/actions/search_index.py ---
@@ -0,0 +1,135 @@
+# --- START OF FILE modules/marzban/actions/user_snapshot.py ---
+"""
+Keeps an in-memory snapshot of the full Marzban user list.
+
+Listing, searching and the daily jobs all need the complete user list, and
+downloading it from a large panel is slow. The snapshot is refreshed at most
+once per TTL, concurrent callers share a single in-flight fetch, and the write
+paths in api.py patch individual entries so the snapshot stays accurate
+between refreshes. It is loaded from the local panel_users mirror while the
+mirror is fresh, and from the live panel otherwise.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from config import config
+
+LOGGER = logging.getLogger(__name__)
+
+_users_by_name: Optional[Dict[str, Dict[str, Any]]] = None
+_users_list: Optional[List[Dict[str, Any]]] = None
+_fetched_at: float = 0.0
+_version: int = 0
+_refresh_lock = asyncio.Lock()
+
+
+def _is_fresh() -> bool:
+    return _users_by_name is not None and (time.monotonic() - _fetched_at) < config.PANEL_USERS_CACHE_TTL
+
+
+def _bump_version() -> None:
+    global _version, _users_list
+    _version += 1
+    _users_list = None
+
+
+def get_version() -> int:
+    """
+    Returns a counter that changes whenever the snapshot content changes.
+    Derived views can store it to know when they need to be rebuilt.
+    """
+    return _version
+
+
+async def get_users(force_refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns the full list of panel users, fetching it from the panel only
+    when the snapshot is missing or older than the configured TTL.
+    force_refresh skips both the snapshot and the local mirror and reads the live panel.
+    Returns None if the panel could not be reached and no snapshot exists.
+    The returned list and its dicts are shared; callers must not mutate them.
+    """
+    global _users_by_name, _fetched_at
+
+    if not force_refresh and _is_fresh():
+        return _current_list()
+
+    started_at = time.monotonic()
+    async with _refresh_lock:
+        # A concurrent caller may have refreshed the snapshot while we waited.
+        if _users_by_name is not None and _fetched_at >= started_at:
+            return _current_list()
+        if not force_refresh and _is_fresh():
+            return _current_list()
+
+        from .api import get_all_users
+        from . import panel_mirror
+        users = None if force_refresh else await panel_mirror.load_users()
+        if users is None:
+            users = await get_all_users()
+        if users is None:
+            if _users_by_name is not None:
+                LOGGER.warning("Could not refresh the panel user snapshot. Serving the previous snapshot.")
+                return _current_list()
+            return None
+
+        _users_by_name = {u['username']: u for u in users if u.get('username')}
+        _fetched_at = time.monotonic()
+        _bump_version()
+        LOGGER.info(f"Panel user snapshot refreshed with {len(_users_by_name)} users.")
+        return _current_list()
+
+
+def _current_list() -> List[Dict[str, Any]]:
+    global _users_list
+    if _users_list is None:
+        _users_list = list(_users_by_name.values()) if _users_by_name else []
+    return _users_list
+
+
+def get_cached_user(username: str) -> Optional[Dict[str, Any]]:
+    """Returns one user from the current snapshot without fetching; None if absent."""
+    return _users_by_name.get(username) if _users_by_name is not None else None
+
+
+def upsert_user(user: Dict[str, Any]) -> None:
+    """Inserts or replaces a single user in the snapshot (e.g. after create or modify)."""
+    username = user.get('username') if isinstance(user, dict) else None
+    if _users_by_name is None or not username:
+        return
+    is_new = username not in _users_by_name
+    _users_by_name[username] = user
+    _bump_version()
+    if is_new:
+        from . import search_index
+        search_index.user_added(username)
+
+
+def patch_user(username: str, fields: Dict[str, Any]) -> None:
+    """Updates selected fields of a single user in the snapshot."""
+    if _users_by_name is None or username not in _users_by_name:
+        return
+    _users_by_name[username] = {**_users_by_name[username], **fields}
+    _bump_version()
+
+
+def remove_user(username: str) -> None:
+    """Removes a single user from the snapshot (e.g. after delete)."""
+    if _users_by_name is None or username not in _users_by_name:
+        return
+    del _users_by_name[username]
+    _bump_version()
+    from . import search_index
+    search_index.user_removed(username)
+
+
+def invalidate() -> None:
+    """Forces the next call to get_users() to fetch a fresh list from the panel."""
+    global _users_by_name, _fetched_at
+    _users_by_name = None
+    _fetched_at = 0.0
+    _bump_version()
+
+# --- END OF FILE modules/marzban/actions/user_snapshot.py ---
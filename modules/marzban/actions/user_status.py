@@ -0,0 +1,190 @@
+# --- START OF FILE modules/marzban/actions/user_status.py ---
+"""
+Classifies panel users (online / unused / warning / expired / active) in one pass.
+
+The result is a column-oriented table computed against a single reference
+timestamp. The table for the full panel is cached per user_snapshot version, so
+the user list, the warning list and search all share one classification
+instead of re-parsing dates for every button on every page flip.
+"""
+import datetime
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from .constants import GB_IN_BYTES
+from . import user_snapshot
+
+LOGGER = logging.getLogger(__name__)
+
+ONLINE = 'online'
+UNUSED = 'unused'
+WARNING = 'warning'
+EXPIRED = 'expired'
+ACTIVE = 'active'
+
+STATUS_EMOJI = {
+    UNUSED: "🟣",
+    ONLINE: "🟢",
+    EXPIRED: "🔴",
+    WARNING: "🟡",
+    ACTIVE: "⚪️",
+}
+
+ONLINE_WINDOW_SECONDS = 180
+WARNING_DAYS = 3
+WARNING_DATA_BYTES = GB_IN_BYTES
+# "Online" depends on the clock, so a cached table is also rebuilt after this many seconds.
+_TABLE_MAX_AGE_SECONDS = 30
+_SECONDS_PER_DAY = 86400
+
+
+@dataclass
+class UserStatusTable:
+    """Per-user status columns; row i of every list describes the same user."""
+    reference_time: float
+    index: Dict[str, int] = field(default_factory=dict)
+    statuses: List[str] = field(default_factory=list)
+    is_online: List[bool] = field(default_factory=list)
+    is_expired: List[bool] = field(default_factory=list)
+    is_warning: List[bool] = field(default_factory=list)
+    # Seconds until expiry (negative once expired); None means no expiry date.
+    seconds_left: List[Optional[float]] = field(default_factory=list)
+    # Remaining traffic in bytes; None means unlimited.
+    data_left_bytes: List[Optional[int]] = field(default_factory=list)
+
+    def row(self, username: str) -> Optional[int]:
+        return self.index.get(username)
+
+    def status_of(self, username: str) -> Optional[str]:
+        i = self.index.get(username)
+        return self.statuses[i] if i is not None else None
+
+    def needs_attention(self, username: str) -> bool:
+        """True for offline users that are expired/disabled or close to running out (the warning list)."""
+        i = self.index.get(username)
+        return i is not None and not self.is_online[i] and (self.is_expired[i] or self.is_warning[i])
+
+    def days_left(self, username: str) -> Optional[int]:
+        """Days until expiry, rounded up; None for users without an expiry date."""
+        i = self.index.get(username)
+        if i is None or self.seconds_left[i] is None:
+            return None
+        return math.ceil(self.seconds_left[i] / _SECONDS_PER_DAY)
+
+
+def parse_online_at(online_at: Any) -> Optional[float]:
+    """Parses the panel's online_at (ISO, UTC when no offset is given) into a Unix timestamp."""
+    if not online_at or not isinstance(online_at, str):
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(online_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def classify(users: Iterable[Dict[str, Any]], now: Optional[float] = None) -> UserStatusTable:
+    """
+    Classifies every user against one reference time (defaults to now).
+
+    Status priority: unused (no traffic yet), online (seen in the last 3
+    minutes), expired (disabled or past expiry), warning (expires within 3
+    days or less than 1 GB left), otherwise active.
+    """
+    now = time.time() if now is None else now
+    table = UserStatusTable(reference_time=now)
+    warning_seconds = WARNING_DAYS * _SECONDS_PER_DAY
+
+    index, statuses = table.index, table.statuses
+    online_col, expired_col, warning_col = table.is_online, table.is_expired, table.is_warning
+    seconds_col, data_col = table.seconds_left, table.data_left_bytes
+
+    for user in users:
+        username = user.get('username')
+        if not username:
+            continue
+
+        used_traffic = user.get('used_traffic') or 0
+        data_limit = user.get('data_limit') or 0
+        expire = user.get('expire')
+
+        online_ts = parse_online_at(user.get('online_at'))
+        is_online = online_ts is not None and (now - online_ts) < ONLINE_WINDOW_SECONDS
+
+        seconds_left = (expire - now) if expire else None
+        data_left = (data_limit - used_traffic) if data_limit > 0 else None
+
+        is_expired = user.get('status', 'disabled') != 'active' or (seconds_left is not None and seconds_left < 0)
+        is_warning = not is_expired and (
+            (seconds_left is not None and 0 < seconds_left <= warning_seconds)
+            or (data_left is not None and data_left < WARNING_DATA_BYTES)
+        )
+
+        if used_traffic == 0:
+            status = UNUSED
+        elif is_online:
+            status = ONLINE
+        elif is_expired:
+            status = EXPIRED
+        elif is_warning:
+            status = WARNING
+        else:
+            status = ACTIVE
+
+        index[username] = len(statuses)
+        statuses.append(status)
+        online_col.append(is_online)
+        expired_col.append(is_expired)
+        warning_col.append(is_warning)
+        seconds_col.append(seconds_left)
+        data_col.append(data_left)
+
+    return table
+
+
+_cached_table: Optional[UserStatusTable] = None
+_cached_version: int = -1
+
+
+def _cached_table_is_current() -> bool:
+    return (
+        _cached_table is not None
+        and _cached_version == user_snapshot.get_version()
+        and time.time() - _cached_table.reference_time < _TABLE_MAX_AGE_SECONDS
+    )
+
+
+def get_cached_status_table() -> Optional[UserStatusTable]:
+    """
+    Returns the last table if it still matches the snapshot, without fetching
+    users or classifying. Returns None otherwise; callers then classify only
+    the users they show.
+    """
+    return _cached_table if _cached_table_is_current() else None
+
+
+async def get_status_table() -> Optional[UserStatusTable]:
+    """
+    Returns the classification of the whole panel, rebuilt only when the
+    snapshot changed or the table is older than a few seconds.
+    Returns None if the user list is unavailable.
+    """
+    global _cached_table, _cached_version
+
+    users = await user_snapshot.get_users()
+    if users is None:
+        return None
+
+    if _cached_table_is_current():
+        return _cached_table
+
+    _cached_table = classify(users)
+    _cached_version = user_snapshot.get_version()
+    return _cached_table
+
+# --- END OF FILE modules/marzban/actions/user_status.py ---
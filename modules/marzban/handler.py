@@ -140,6 +140,7 @@ def register(application: Application) -> None:
         
         CallbackQueryHandler(display.show_status_legend, pattern=r'^show_status_legend$'),
         CallbackQueryHandler(display.update_user_page, pattern=r'^show_users_page_'),
+        CallbackQueryHandler(display.refresh_user_list, pattern=r'^refresh_users_'),
         CallbackQueryHandler(display.show_user_details, pattern=r'^user_details_'),
         CallbackQueryHandler(display.close_pagination_message, pattern=r'^close_pagination$'),
 
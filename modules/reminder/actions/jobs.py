@@ -1,15 +1,20 @@
 # --- START OF FILE modules/reminder/actions/jobs.py ---
+import asyncio
 import datetime
 import logging
+import time
 import jdatetime
+from typing import Optional, Tuple
 from telegram.ext import ContextTypes, Application
 from telegram.constants import ParseMode
 from telegram.helpers import escape_markdown
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
-from modules.marzban.actions.api import get_all_users, delete_user_api, get_user_data
+from modules.marzban.actions.api import delete_users_api, get_user_data, PanelUsersFetchError
+from modules.marzban.actions import panel_mirror, user_snapshot, user_status
 from modules.marzban.actions.constants import GB_IN_BYTES
 from shared.log_channel import send_log
+from shared.delivery import DeliveryQueue
 from database.crud import (
     bot_setting as crud_bot_setting,
     non_renewal_user as crud_non_renewal,
@@ -18,11 +23,14 @@ from database.crud import (
     user_note as crud_user_note,
     user as crud_user,marzban_link as crud_marzban_link
 )
-from modules.marzban.actions.data_manager import cleanup_marzban_user_data, load_users_map
+from modules.marzban.actions.data_manager import cleanup_marzban_users_bulk, load_users_map
 from modules.payment.actions.approval import approve_payment
 
 LOGGER = logging.getLogger(__name__)
 
+# Expired users deleted per round: panel deletes run in parallel, then one bulk DB cleanup.
+_AUTO_DELETE_CHUNK_SIZE = 200
+
 async def _perform_auto_renewal(context: ContextTypes.DEFAULT_TYPE, telegram_user_id: int, marzban_username: str, subscription_price: int, **kwargs) -> bool:
     price = float(subscription_price)
 
@@ -33,8 +41,7 @@ async def _perform_auto_renewal(context: ContextTypes.DEFAULT_TYPE, telegram_use
 
     LOGGER.info(f"Auto-renewal funds secured for {marzban_username}. Balance deducted. Proceeding to renewal.")
 
-    note_data = await crud_user_note.get_user_note(marzban_username)
-    duration = note_data.subscription_duration if note_data else 30
+    duration = kwargs.get('subscription_duration') or 30
     user_panel_data = await get_user_data(marzban_username)
     volume_gb = (user_panel_data.get('data_limit', 0) / GB_IN_BYTES) if user_panel_data else 0
 
@@ -81,6 +88,90 @@ async def _perform_auto_renewal(context: ContextTypes.DEFAULT_TYPE, telegram_use
         return False
 
 
+async def _check_auto_renewal(
+    context: ContextTypes.DEFAULT_TYPE, delivery: DeliveryQueue, panel_user: dict, note_info, telegram_user_id: int,
+    seconds_left: Optional[float], days_threshold: int, success_report: list, fail_report: list
+) -> bool:
+    """
+    Handles an auto-renew user. Returns True if the user was inside the expiry
+    window and has been dealt with here, so no standard reminder should follow.
+    """
+    from shared.translator import _
+
+    marzban_username = panel_user['username']
+
+    if panel_user.get('status') != 'active' or (note_info and note_info.is_test_account):
+        return False
+
+    if seconds_left is None or not (0 < seconds_left < days_threshold * 86400):
+        return False
+
+    user_note = note_info
+    wallet_balance_obj = await crud_user.get_user_wallet_balance(telegram_user_id)
+    wallet_balance = float(wallet_balance_obj) if wallet_balance_obj is not None else 0.0
+    price = float(user_note.subscription_price) if user_note and user_note.subscription_price is not None else 0.0
+
+    if wallet_balance >= price and price > 0:
+        LOGGER.info(f"Attempting auto-renewal for '{marzban_username}' (Sufficient funds).")
+        full_user_data = {
+            "telegram_user_id": telegram_user_id,
+            "marzban_username": marzban_username,
+            "subscription_price": int(price),
+            "subscription_duration": user_note.subscription_duration if user_note else 30
+        }
+
+        if await _perform_auto_renewal(context, **full_user_data):
+            success_report.append(panel_user)
+        else:
+            fail_report.append(panel_user)
+    
+    else:
+        LOGGER.info(f"User '{marzban_username}' has insufficient funds for auto-renewal. Queueing warning.")
+        delivery.submit(telegram_user_id, context.bot.send_message, text=_("reminder_jobs.auto_renew_failed_customer_funds"))
+        fail_report.append(panel_user)
+
+    return True
+
+
+async def _check_standard_reminder(
+    context: ContextTypes.DEFAULT_TYPE, delivery: DeliveryQueue, panel_user: dict, note_info, users_map: dict, non_renewal_set: set,
+    seconds_left: Optional[float], data_left_bytes: Optional[int], days_threshold: int, data_gb_threshold: float
+) -> Optional[Tuple[bool, bool]]:
+    """
+    Queues the standard expiry / low-data reminder for the customer if needed.
+    Returns (is_expiring, is_low_data), or None if the user is not eligible for reminders.
+    """
+    from shared.translator import _
+
+    username = panel_user['username']
+    if username in non_renewal_set:
+        return None
+
+    if panel_user.get('status') != 'active' or (note_info and note_info.is_test_account):
+        return None
+
+    is_expiring = seconds_left is not None and 0 < seconds_left < days_threshold * 86400
+    is_low_data = data_left_bytes is not None and data_left_bytes < data_gb_threshold * GB_IN_BYTES
+    
+    customer_telegram_id = users_map.get(username)
+    if customer_telegram_id and (is_expiring or is_low_data):
+        customer_message = _("reminder_jobs.customer_reminder_title", username=f"`{username}`")
+        if is_expiring:
+            customer_message += _("reminder_jobs.customer_reminder_days_left", days=int(seconds_left // 86400) + 1)
+        if is_low_data:
+            remaining_gb = data_left_bytes / GB_IN_BYTES
+            customer_message += _("reminder_jobs.customer_reminder_data_left", gb=f"{remaining_gb:.2f}")
+        customer_message += _("reminder_jobs.customer_reminder_footer")
+        
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(_("reminder_jobs.button_request_renewal"), callback_data=f"customer_renew_request_{username}")],
+            [InlineKeyboardButton(_("reminder_jobs.button_do_not_renew"), callback_data=f"customer_do_not_renew_{username}")]
+        ])
+        delivery.submit(customer_telegram_id, context.bot.send_message, text=customer_message, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+
+    return is_expiring, is_low_data
+
+
 async def check_users_for_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
     from shared.translator import _
     
@@ -88,6 +179,10 @@ async def check_users_for_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
     bot_username = context.bot.username
     LOGGER.info(f"Executing daily job for admin {admin_id}...")
 
+    # Customer messages are sent in the background while the job keeps scanning and reporting.
+    delivery = DeliveryQueue(name="reminders")
+    delivery.start()
+
     try:
         expired_count = await crud_invoice.expire_old_pending_invoices()
         if expired_count > 0:
@@ -96,111 +191,52 @@ async def check_users_for_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
             await send_log(context.bot, log_message, parse_mode=ParseMode.MARKDOWN)
 
         settings = await crud_bot_setting.load_bot_settings()
-        all_users_from_panel = await get_all_users()
-        if all_users_from_panel is None:
-            await context.bot.send_message(admin_id, _("reminder_jobs.daily_report_panel_error"))
-            return
-
-        panel_users_dict = {user['username']: user for user in all_users_from_panel if user.get('username')}
         days_threshold = settings.get('reminder_days', 3)
         data_gb_threshold = settings.get('reminder_data_gb', 1)
-        non_renewal_list = await crud_non_renewal.get_all_non_renewal_users()
+        non_renewal_set = set(await crud_non_renewal.get_all_non_renewal_users())
         users_map = await load_users_map()
         
         # [ORM CHANGE]: Use the new CRUD function
         auto_renew_candidates = await crud_marzban_link.get_all_auto_renew_links()
+        auto_renew_links = {link.marzban_username: link.telegram_user_id for link in auto_renew_candidates}
         
         expiring_users, low_data_users, auto_renew_success_report, auto_renew_fail_report = [], [], [], []
-        processed_users = set()
-
-        LOGGER.info(f"Found {len(auto_renew_candidates)} total users with auto-renew enabled. Checking them now...")
-        for user_link in auto_renew_candidates:  # <-- Changed variable name for clarity
-            # [ORM CHANGE]: Access attributes with dot notation
-            marzban_username = user_link.marzban_username
-            telegram_user_id = user_link.telegram_user_id
-            
-            panel_user = panel_users_dict.get(marzban_username)
-            note_info = await crud_user_note.get_user_note(marzban_username)
-            
-            if not panel_user or panel_user.get('status') != 'active' or (note_info and note_info.is_test_account):
-                continue
 
-            if expire_ts := panel_user.get('expire'):
-                expire_date = datetime.datetime.fromtimestamp(expire_ts)
-                now = datetime.datetime.now()
-                if now < expire_date < (now + datetime.timedelta(days=days_threshold)):
-                    
-                    user_note = await crud_user_note.get_user_note(marzban_username)
-                    wallet_balance_obj = await crud_user.get_user_wallet_balance(telegram_user_id)
-                    wallet_balance = float(wallet_balance_obj) if wallet_balance_obj is not None else 0.0
-                    price = float(user_note.subscription_price) if user_note and user_note.subscription_price is not None else 0.0
-
-                    if wallet_balance >= price and price > 0:
-                        LOGGER.info(f"Attempting auto-renewal for '{marzban_username}' (Sufficient funds).")
-                        full_user_data = {
-                            "telegram_user_id": telegram_user_id,
-                            "marzban_username": marzban_username,
-                            "subscription_price": int(price),
-                            "subscription_duration": user_note.subscription_duration if user_note else 30
-                        }
-
-                        if await _perform_auto_renewal(context, **full_user_data):
-                            auto_renew_success_report.append(panel_user)
-                        else:
-                            auto_renew_fail_report.append(panel_user)
-                    
-                    else:
-                        LOGGER.info(f"User '{marzban_username}' has insufficient funds for auto-renewal. Sending warning.")
-                        try:
-                            await context.bot.send_message(telegram_user_id, _("reminder_jobs.auto_renew_failed_customer_funds"))
-                            auto_renew_fail_report.append(panel_user)
-                        except Exception as e:
-                            LOGGER.warning(f"Failed to send warning to customer for {marzban_username}: {e}")
-                    
-                    processed_users.add(marzban_username)
-        
-        LOGGER.info("Processing standard reminders for users without auto-renew or not in expiry window.")
-        for panel_user in all_users_from_panel:
-            username = panel_user.get('username')
-            note_info = await crud_user_note.get_user_note(username)
-            if not username or username in processed_users or username in non_renewal_list:
-                continue
-
-            if panel_user.get('status') != 'active' or (note_info and note_info.is_test_account):
-                continue
-
-            is_expiring, is_low_data, expire_date = False, False, None
-            if expire_ts := panel_user.get('expire'):
-                expire_date = datetime.datetime.fromtimestamp(expire_ts)
-                if datetime.datetime.now() < expire_date < (datetime.datetime.now() + datetime.timedelta(days=days_threshold)):
-                    is_expiring = True
-            
-            data_limit = panel_user.get('data_limit') or 0
-            if data_limit > 0 and (data_limit - (panel_user.get('used_traffic') or 0)) < (data_gb_threshold * GB_IN_BYTES):
-                is_low_data = True
-            
-            customer_telegram_id = users_map.get(username)
-            if customer_telegram_id and (is_expiring or is_low_data):
-                try:
-                    customer_message = _("reminder_jobs.customer_reminder_title", username=f"`{username}`")
-                    if is_expiring and expire_date:
-                        time_left = expire_date - datetime.datetime.now()
-                        customer_message += _("reminder_jobs.customer_reminder_days_left", days=time_left.days + 1)
-                    if is_low_data:
-                        remaining_gb = (data_limit - (panel_user.get('used_traffic') or 0)) / GB_IN_BYTES
-                        customer_message += _("reminder_jobs.customer_reminder_data_left", gb=f"{remaining_gb:.2f}")
-                    customer_message += _("reminder_jobs.customer_reminder_footer")
-                    
-                    keyboard = InlineKeyboardMarkup([
-                        [InlineKeyboardButton(_("reminder_jobs.button_request_renewal"), callback_data=f"customer_renew_request_{username}")],
-                        [InlineKeyboardButton(_("reminder_jobs.button_do_not_renew"), callback_data=f"customer_do_not_renew_{username}")]
-                    ])
-                    await context.bot.send_message(chat_id=customer_telegram_id, text=customer_message, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
-                except Exception as e:
-                    LOGGER.warning(f"Failed to send reminder to customer {customer_telegram_id} for user {username}: {e}")
-
-            if is_expiring: expiring_users.append(panel_user)
-            if is_low_data and not is_expiring: low_data_users.append(panel_user)
+        LOGGER.info(f"Found {len(auto_renew_links)} total users with auto-renew enabled. Streaming users...")
+        # Every page is classified against the same moment, so the whole run sees one consistent "now".
+        reference_time = time.time()
+        try:
+            async for page in panel_mirror.iter_users():
+                # One query per page instead of one or two per user.
+                notes_map = await crud_user_note.get_user_notes_map(u['username'] for u in page if u.get('username'))
+                status_table = user_status.classify(page, now=reference_time)
+                for panel_user in page:
+                    username = panel_user.get('username')
+                    if not username:
+                        continue
+                    note_info = notes_map.get(username)
+                    row = status_table.row(username)
+                    seconds_left, data_left_bytes = status_table.seconds_left[row], status_table.data_left_bytes[row]
+
+                    if username in auto_renew_links and await _check_auto_renewal(
+                        context, delivery, panel_user, note_info, auto_renew_links[username], seconds_left, days_threshold,
+                        auto_renew_success_report, auto_renew_fail_report
+                    ):
+                        continue
+
+                    reminder_result = await _check_standard_reminder(
+                        context, delivery, panel_user, note_info, users_map, non_renewal_set,
+                        seconds_left, data_left_bytes, days_threshold, data_gb_threshold
+                    )
+                    if reminder_result is None:
+                        continue
+                    is_expiring, is_low_data = reminder_result
+                    if is_expiring: expiring_users.append(panel_user)
+                    if is_low_data and not is_expiring: low_data_users.append(panel_user)
+        except PanelUsersFetchError as e:
+            LOGGER.error(f"Daily job could not read users from the panel: {e}")
+            await context.bot.send_message(admin_id, _("reminder_jobs.daily_report_panel_error"))
+            return
         
         auto_renew_attempts = auto_renew_success_report + auto_renew_fail_report
         if any([expiring_users, low_data_users, auto_renew_attempts]):
@@ -222,8 +258,7 @@ async def check_users_for_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
             if expiring_users:
                 report_parts.append(_("reminder_jobs.admin_report_expiring_users_title"))
                 for u in expiring_users:
-                    time_left = datetime.datetime.fromtimestamp(u['expire']) - datetime.datetime.now()
-                    reason = _("reminder_jobs.admin_report_expiring_reason", days=time_left.days + 1)
+                    reason = _("reminder_jobs.admin_report_expiring_reason", days=int((u['expire'] - reference_time) // 86400) + 1)
                     report_parts.append(format_user_line(u, reason))
                     
             if low_data_users:
@@ -246,6 +281,19 @@ async def check_users_for_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
             await context.bot.send_message(admin_id, error_message, parse_mode=ParseMode.MARKDOWN_V2)
         except Exception as notify_error:
             LOGGER.error(f"Failed to notify admin about the job failure: {notify_error}")
+    finally:
+        stats = await delivery.join()
+        if stats.total:
+            LOGGER.info(f"Daily job delivered {stats.sent}/{stats.total} customer messages ({stats.failed} failed).")
+
+
+def _is_past_grace(user: dict, managed_users: set, grace_period: datetime.timedelta, now: datetime.datetime) -> bool:
+    """True if a bot-managed, non-active user expired longer ago than the grace period."""
+    username = user.get('username')
+    if not username or user.get('status') == 'active' or username not in managed_users:
+        return False
+    expire_ts = user.get('expire')
+    return bool(expire_ts) and now > datetime.datetime.fromtimestamp(expire_ts) + grace_period
 
 
 async def auto_delete_expired_users(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -258,31 +306,40 @@ async def auto_delete_expired_users(context: ContextTypes.DEFAULT_TYPE) -> None:
     if grace_days <= 0:
         LOGGER.info("Auto-delete is disabled. Skipping."); return
 
-    all_users = await get_all_users()
-    if all_users is None:
-        LOGGER.error("Auto-delete job failed: Could not fetch users."); return
-
     managed_users_set = set(await crud_managed_user.get_all_managed_users())
     if not managed_users_set:
         LOGGER.info("No bot-managed users found. Auto-delete job finished."); return
         
-    deleted_users = []
+    deleted_users, expired_usernames = [], []
     grace_period = datetime.timedelta(days=grace_days)
+    now = datetime.datetime.now()
 
-    for user in all_users:
-        username = user.get('username')
-        if not username or user.get('status') == 'active' or username not in managed_users_set:
+    # Collect candidates first: deleting while paging would shift the panel's offsets.
+    try:
+        async for page in panel_mirror.iter_users():
+            for user in page:
+                if _is_past_grace(user, managed_users_set, grace_period, now):
+                    expired_usernames.append(user['username'])
+    except PanelUsersFetchError as e:
+        LOGGER.error(f"Auto-delete job failed: Could not fetch users. {e}"); return
+
+    if expired_usernames:
+        LOGGER.info(f"{len(expired_usernames)} users are expired for more than {grace_days} days. Deleting...")
+    for i in range(0, len(expired_usernames), _AUTO_DELETE_CHUNK_SIZE):
+        # The mirror can lag the panel; a user renewed since the last sync must not be deleted.
+        chunk = expired_usernames[i:i + _AUTO_DELETE_CHUNK_SIZE]
+        live_users = await asyncio.gather(*(get_user_data(username, use_cache=False) for username in chunk))
+        confirmed = [u['username'] for u in live_users if u and _is_past_grace(u, managed_users_set, grace_period, now)]
+        if len(confirmed) < len(chunk):
+            LOGGER.info(f"Skipping {len(chunk) - len(confirmed)} auto-delete candidates that are no longer expired on the panel.")
+        if not confirmed:
             continue
-            
-        if expire_ts := user.get('expire'):
-            expire_date = datetime.datetime.fromtimestamp(expire_ts)
-            if datetime.datetime.now() > (expire_date + grace_period):
-                LOGGER.info(f"User '{username}' is expired for more than {grace_days} days. Deleting...")
-                if (await delete_user_api(username))[0]:
-                    await cleanup_marzban_user_data(username)
-                    deleted_users.append(username)
-                else:
-                    LOGGER.error(f"Failed to delete user '{username}' from Marzban panel.")
+        deleted, failed = await delete_users_api(confirmed)
+        for username, error in failed.items():
+            LOGGER.error(f"Failed to delete user '{username}' from Marzban panel: {error}")
+        if deleted and not await cleanup_marzban_users_bulk(deleted):
+            LOGGER.error(f"Deleted {len(deleted)} users from the panel but could not clean up their bot data.")
+        deleted_users.extend(deleted)
     
     if deleted_users:
         safe_deleted_list = ", ".join(f"`{u}`" for u in deleted_users)
@@ -338,42 +395,57 @@ async def cleanup_expired_test_accounts(context: ContextTypes.DEFAULT_TYPE) -> N
         
     LOGGER.info(f"Found {len(test_accounts)} test accounts to check.")
     
-    deleted_users_count = 0
+    # One bulk read (mirror or panel) instead of a GET per test account.
+    all_users = await user_snapshot.get_users()
+    if all_users is None:
+        LOGGER.error("Test account cleanup job aborted: Could not fetch the panel user list.")
+        return
+    users_by_name = {u['username']: u for u in all_users if u.get('username')}
+    now_ts = datetime.datetime.now().timestamp()
     
-    users_map = await load_users_map()
-
+    ghost_usernames, expired_usernames = [], []
     for test_account in test_accounts:
         username = test_account.username
-        telegram_user_id = users_map.get(username)
-        
-        user_data = await get_user_data(username)
+        user_data = users_by_name.get(username)
         
         # Scenario 1: User is in our DB but not in Marzban panel (ghost user)
         if not user_data:
+            # The snapshot can lag behind the panel, so confirm before dropping the records.
+            if await get_user_data(username):
+                continue
             LOGGER.warning(f"Test account '{username}' found in DB but not in Marzban. Cleaning up DB records.")
-            await cleanup_marzban_user_data(username)
+            ghost_usernames.append(username)
             # (✨ FIX) No message is sent to the user in this silent cleanup job.
             continue
             
         expire_ts = user_data.get('expire', 0)
         
         # Scenario 2: User exists and their expiration time has passed
-        if expire_ts and expire_ts < datetime.datetime.now().timestamp():
-            LOGGER.info(f"Test account '{username}' has expired. Deleting now...")
-            
-            success, message = await delete_user_api(username)
-            if success:
-                await cleanup_marzban_user_data(username)
-                deleted_users_count += 1
-                LOGGER.info(f"Successfully deleted expired test account '{username}'.")
-                
-                # (✨ FIX) The block that sent a message to the user has been completely removed.
-                # The primary job (_cleanup_test_account_job) is responsible for notifying the user.
-                # This hourly job only cleans up silently.
-                
-            else:
-                LOGGER.error(f"Failed to delete expired test account '{username}' from Marzban. API Error: {message}")
-                
+        if expire_ts and expire_ts < now_ts:
+            expired_usernames.append(username)
+    
+    # The primary job (_cleanup_test_account_job) is responsible for notifying the user.
+    # This hourly job only cleans up silently.
+    # The snapshot may come from the mirror; an account extended since the last sync must survive.
+    if expired_usernames:
+        live_users = await asyncio.gather(*(get_user_data(username, use_cache=False) for username in expired_usernames))
+        confirmed = [u['username'] for u in live_users if u and u.get('expire') and u['expire'] < now_ts]
+        if len(confirmed) < len(expired_usernames):
+            LOGGER.info(f"Skipping {len(expired_usernames) - len(confirmed)} test accounts that are no longer expired on the panel.")
+        expired_usernames = confirmed
+
+    deleted = []
+    if expired_usernames:
+        LOGGER.info(f"{len(expired_usernames)} test accounts have expired. Deleting now...")
+        deleted, failed = await delete_users_api(expired_usernames)
+        for username, error in failed.items():
+            LOGGER.error(f"Failed to delete expired test account '{username}' from Marzban. API Error: {error}")
+    deleted_users_count = len(deleted)
+    
+    # Ghost accounts and the accounts just deleted from the panel lose their DB records in one transaction.
+    if ghost_usernames or deleted:
+        await cleanup_marzban_users_bulk(ghost_usernames + deleted)
+
     # This part remains to notify the ADMIN via the log channel.
     if deleted_users_count > 0:
         log_message = _("reminder_jobs.test_account_cleanup_report", count=deleted_users_count)
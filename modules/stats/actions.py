@@ -8,9 +8,14 @@ from telegram.constants import ParseMode
 
 from database.crud import user as crud_user
 from shared.auth import admin_only
+from shared.handler_registry import get_handler_stats
+from modules.marzban.actions.api import get_panel_stats
 
 LOGGER = logging.getLogger(__name__)
 
+# Handlers with the most total time shown in the stats message.
+_TOP_HANDLERS_COUNT = 5
+
 def _get_bot_version() -> str:
     from shared.translator import _
     try:
@@ -51,6 +56,18 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     stats_text += _("stats.total_users", count=total_users)
     stats_text += _("stats.ping_to_telegram", ping=ping_text)
 
+    panel = get_panel_stats()
+    panel_state = _(f"stats.panel_state_{panel['state']}", seconds=panel['retry_in_seconds'])
+    stats_text += _("stats.panel_title", state=panel_state)
+    stats_text += _("stats.panel_in_flight", in_flight=panel['in_flight'], limit=panel['limit'])
+    stats_text += _("stats.panel_error_rate", samples=panel['samples'], rate=panel['error_rate'] * 100, rejected=panel['rejected'])
+
+    handler_stats = get_handler_stats()[:_TOP_HANDLERS_COUNT]
+    if handler_stats:
+        stats_text += _("stats.handlers_title")
+        for s in handler_stats:
+            stats_text += _("stats.handler_line", name=s.name, count=s.count, avg_ms=s.avg_ms, max_ms=s.max_seconds * 1000)
+
     await message.edit_text(stats_text, parse_mode=ParseMode.MARKDOWN)
 
 # --- END OF FILE modules/stats/actions.py ---
\ No newline at end of file
@@ -0,0 +1,47 @@
+# FILE: shared/activity.py
+
+"""
+Write-behind buffer for users' last_activity timestamps.
+
+Updates only record the latest timestamp per user in memory; a repeating job
+writes the whole buffer to the database in bulk, so handling an update never
+waits on a database round trip.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict
+
+from telegram.ext import ContextTypes
+
+from database.crud import user as crud_user
+
+LOGGER = logging.getLogger(__name__)
+
+_pending: Dict[int, datetime] = {}
+
+
+def record_activity(user_id: int) -> None:
+    """Remembers that the user was active now. Never touches the database."""
+    _pending[user_id] = datetime.now()
+
+
+async def flush_activity() -> int:
+    """Writes all buffered timestamps to the database. Returns the number of users flushed."""
+    global _pending
+    if not _pending:
+        return 0
+    batch, _pending = _pending, {}
+
+    updated = await crud_user.bulk_update_last_activity(batch)
+    if updated < 0:
+        # Put the batch back unless the user was active again in the meantime.
+        for user_id, seen_at in batch.items():
+            _pending.setdefault(user_id, seen_at)
+        return 0
+    LOGGER.debug(f"Flushed last activity for {len(batch)} users ({updated} rows updated).")
+    return len(batch)
+
+
+async def flush_activity_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await flush_activity()
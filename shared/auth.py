@@ -2,6 +2,8 @@
 
 from functools import wraps
 import logging
+import time
+from typing import Dict, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler
 from telegram import error, InlineKeyboardButton, InlineKeyboardMarkup
@@ -76,6 +78,49 @@ def _create_join_channel_keyboard(channel_username: str) -> InlineKeyboardMarkup
     ]
     return InlineKeyboardMarkup(keyboard)
 
+# Membership results per (channel, user_id): (is_member, expires_at). Members rarely leave, so they are
+# trusted for hours; non-members are re-checked quickly so joining takes effect almost immediately.
+MEMBER_CACHE_TTL_SECONDS = 6 * 3600
+NON_MEMBER_CACHE_TTL_SECONDS = 15
+_MEMBERSHIP_CACHE_MAX_SIZE = 50000
+_membership_cache: Dict[Tuple[str, int], Tuple[bool, float]] = {}
+
+
+def invalidate_membership(user_id: int) -> None:
+    """Drops cached membership results for a user so the next check asks Telegram again."""
+    for key in [key for key in _membership_cache if key[1] == user_id]:
+        del _membership_cache[key]
+
+
+def _remember_membership(channel_username: str, user_id: int, is_member: bool) -> None:
+    now = time.monotonic()
+    if len(_membership_cache) >= _MEMBERSHIP_CACHE_MAX_SIZE:
+        for key in [key for key, (_member, expires_at) in _membership_cache.items() if expires_at <= now]:
+            del _membership_cache[key]
+        if len(_membership_cache) >= _MEMBERSHIP_CACHE_MAX_SIZE:
+            _membership_cache.clear()
+    ttl = MEMBER_CACHE_TTL_SECONDS if is_member else NON_MEMBER_CACHE_TTL_SECONDS
+    _membership_cache[(channel_username, user_id)] = (is_member, now + ttl)
+
+
+async def _is_channel_member(bot, channel_username: str, user_id: int) -> bool:
+    cached = _membership_cache.get((channel_username, user_id))
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
+    try:
+        member = await bot.get_chat_member(chat_id=f"@{channel_username}", user_id=user_id)
+        is_member = member.status in ['member', 'administrator', 'creator']
+    except (error.BadRequest, error.Forbidden) as e:
+        LOGGER.error(f"Error checking membership for @{channel_username}: {e}. Disabling check temporarily for this user.")
+        # Let the user through, but only cache it briefly so the check resumes once the problem is fixed.
+        _membership_cache[(channel_username, user_id)] = (True, time.monotonic() + NON_MEMBER_CACHE_TTL_SECONDS)
+        return True
+
+    _remember_membership(channel_username, user_id, is_member)
+    return is_member
+
+
 def ensure_channel_membership(func):
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
@@ -99,12 +144,11 @@ def ensure_channel_membership(func):
             LOGGER.warning("Forced join is active, but no channel username is configured.")
             return await func(update, context, *args, **kwargs)
 
-        try:
-            member = await context.bot.get_chat_member(chat_id=f"@{channel_username}", user_id=user.id)
-            if member.status in ['member', 'administrator', 'creator']:
-                return await func(update, context, *args, **kwargs)
-        except (error.BadRequest, error.Forbidden) as e:
-            LOGGER.error(f"Error checking membership for @{channel_username}: {e}. Disabling check temporarily for this user.")
+        # The "check membership" button must always ask Telegram, never a cached answer.
+        if update.callback_query and update.callback_query.data == "check_join_status":
+            invalidate_membership(user.id)
+
+        if await _is_channel_member(context.bot, channel_username, user.id):
             return await func(update, context, *args, **kwargs)
 
         message_text = _("general.forced_join_message", channel=f"@{channel_username}")
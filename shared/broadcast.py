@@ -0,0 +1,195 @@
+# FILE: shared/broadcast.py
+
+"""
+Sends one message to many users through a DeliveryQueue and keeps an admin
+status message updated with the progress.
+
+Used by the message builder, the forwarder and the universal gift notification.
+run_checkpointed_broadcast() additionally records per-recipient progress in the
+broadcast_recipients table so an interrupted broadcast can be resumed.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from database.crud import broadcast as crud_broadcast
+from shared.delivery import DeliveryQueue, DeliveryStats
+
+LOGGER = logging.getLogger(__name__)
+
+# Broadcast sends are short; more workers hide latency while the shared bucket keeps the rate in check.
+BROADCAST_WORKERS = 16
+PROGRESS_UPDATE_INTERVAL_SECONDS = 5
+# Recipients are claimed in batches this size; a crash can skip at most about two batches.
+CLAIM_BATCH_SIZE = 100
+CHECKPOINT_FLUSH_INTERVAL_SECONDS = 2
+
+
+async def _safe_edit_progress(bot: Bot, chat_id: int, message_id: int, text: str) -> None:
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode=ParseMode.HTML)
+    except TelegramError as e:
+        # "Message is not modified" and similar errors must never stop a broadcast.
+        LOGGER.debug(f"Could not update broadcast progress message: {e}")
+
+
+async def run_broadcast(
+    bot: Bot,
+    chat_ids: Iterable[int],
+    send: Callable[..., Awaitable[Any]],
+    *,
+    name: str,
+    status_chat_id: Optional[int] = None,
+    on_result: Optional[Callable[[int, bool], Any]] = None,
+    claim: Optional[Callable[[List[int]], Awaitable[Optional[List[int]]]]] = None,
+    release: Optional[Callable[[List[int]], Awaitable[Any]]] = None,
+    **send_kwargs,
+) -> DeliveryStats:
+    """
+    Calls `send(chat_id=..., **send_kwargs)` for every chat id and waits for all of them.
+    If `status_chat_id` is given, a progress message is posted there and edited
+    periodically until the broadcast ends.
+    If `claim` is given, chat ids are handed to the queue in batches of
+    CLAIM_BATCH_SIZE. `await claim(batch)` runs before each batch and returns
+    the chat ids it claimed; only those are queued. If it returns None, no
+    further batches are queued and the broadcast ends once the queue drains.
+    If the broadcast is cancelled, `await release(chat_ids)` receives the queued
+    chat ids that were never attempted.
+    """
+    from shared.translator import _
+
+    chat_ids = list(chat_ids)
+    total = len(chat_ids)
+    delivery = DeliveryQueue(name=name, workers=BROADCAST_WORKERS, on_result=on_result)
+
+    def progress_text() -> str:
+        return _("broadcaster.progress", job_id=name, done=delivery.stats.total, total=total,
+                 success=delivery.stats.sent, failure=delivery.stats.failed)
+
+    status_message = None
+    if status_chat_id is not None:
+        try:
+            status_message = await bot.send_message(chat_id=status_chat_id, text=progress_text(), parse_mode=ParseMode.HTML)
+        except TelegramError as e:
+            LOGGER.warning(f"Could not send broadcast progress message for '{name}': {e}")
+
+    async def report_progress() -> None:
+        last_done = -1
+        while True:
+            await asyncio.sleep(PROGRESS_UPDATE_INTERVAL_SECONDS)
+            if delivery.stats.total != last_done:
+                last_done = delivery.stats.total
+                await _safe_edit_progress(bot, status_chat_id, status_message.message_id, progress_text())
+
+    LOGGER.info(f"Broadcast '{name}' started for {total} chats.")
+    delivery.start()
+    progress_task = asyncio.create_task(report_progress()) if status_message else None
+    try:
+        if claim is None:
+            for chat_id in chat_ids:
+                delivery.submit(chat_id, send, **send_kwargs)
+        else:
+            for i in range(0, total, CLAIM_BATCH_SIZE):
+                # Only claim the next batch when the queue is nearly empty, so few recipients are in flight.
+                while delivery.pending >= CLAIM_BATCH_SIZE:
+                    await asyncio.sleep(0.5)
+                claimed = await claim(chat_ids[i:i + CLAIM_BATCH_SIZE])
+                if claimed is None:
+                    LOGGER.error(f"Broadcast '{name}': could not claim the next recipients. Stopping after the queued ones.")
+                    break
+                for chat_id in claimed:
+                    delivery.submit(chat_id, send, **send_kwargs)
+        stats = await delivery.join()
+    except asyncio.CancelledError:
+        unsent = await delivery.stop()
+        if release and unsent:
+            await release(unsent)
+        raise
+    finally:
+        if progress_task:
+            progress_task.cancel()
+            await asyncio.gather(progress_task, return_exceptions=True)
+
+    if status_message:
+        await _safe_edit_progress(bot, status_chat_id, status_message.message_id, progress_text())
+    LOGGER.info(f"Broadcast '{name}' finished. Success: {stats.sent}, Failure: {stats.failed}")
+    return stats
+
+
+async def run_checkpointed_broadcast(
+    bot: Bot,
+    broadcast_id: int,
+    send: Callable[..., Awaitable[Any]],
+    *,
+    name: str,
+    status_chat_id: Optional[int] = None,
+    **send_kwargs,
+) -> DeliveryStats:
+    """
+    Sends a broadcast recorded with crud_broadcast.create_broadcast() to its
+    pending recipients, persisting progress as it goes.
+
+    Recipients are claimed (moved from 'pending' to 'sending') before they are
+    queued, and only the ones actually claimed are sent to; they are marked
+    'sent'/'failed' in periodic batches. If a claim cannot be written, the run
+    stops and the broadcast stays 'running' so it is resumed on the next start. On a clean shutdown, queued recipients that were never
+    attempted go back to 'pending'. When resuming, recipients still marked
+    'sending' are counted as failed rather than sent again, so nobody gets the
+    message twice.
+    Returns the totals for the whole broadcast, including earlier runs.
+    """
+    released = await crud_broadcast.release_claimed_recipients(broadcast_id)
+    if released:
+        LOGGER.warning(f"Broadcast {broadcast_id}: {released} recipients were in flight during a restart and will not be retried.")
+    pending_ids = await crud_broadcast.get_recipient_ids(broadcast_id, "pending")
+
+    results: Dict[str, List[int]] = {"sent": [], "failed": []}
+    claim_failed = False
+
+    def record_result(chat_id: int, success: bool) -> None:
+        results["sent" if success else "failed"].append(chat_id)
+
+    async def flush_results() -> None:
+        for status in ("sent", "failed"):
+            user_ids, results[status] = results[status], []
+            if user_ids and not await crud_broadcast.set_recipients_status(broadcast_id, user_ids, status):
+                # Keep them for the next flush instead of losing the checkpoint.
+                results[status].extend(user_ids)
+
+    async def claim(user_ids: List[int]) -> Optional[List[int]]:
+        nonlocal claim_failed
+        await flush_results()
+        claimed = await crud_broadcast.claim_recipients(broadcast_id, user_ids)
+        if claimed is None:
+            claim_failed = True
+        return claimed
+
+    async def release(user_ids: List[int]) -> None:
+        await crud_broadcast.set_recipients_status(broadcast_id, user_ids, "pending")
+
+    async def flush_periodically() -> None:
+        while True:
+            await asyncio.sleep(CHECKPOINT_FLUSH_INTERVAL_SECONDS)
+            await flush_results()
+
+    flusher = asyncio.create_task(flush_periodically())
+    try:
+        await run_broadcast(
+            bot, pending_ids, send, name=name, status_chat_id=status_chat_id,
+            on_result=record_result, claim=claim, release=release, **send_kwargs
+        )
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        await flush_results()
+
+    broadcast = None if claim_failed else await crud_broadcast.finish_broadcast(broadcast_id)
+    if broadcast is None:
+        counts = await crud_broadcast.get_recipient_counts(broadcast_id)
+        return DeliveryStats(sent=counts.get("sent", 0), failed=counts.get("failed", 0))
+    return DeliveryStats(sent=broadcast.success_count, failed=broadcast.failure_count)
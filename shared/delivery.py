@@ -0,0 +1,231 @@
+# FILE: shared/delivery.py
+
+"""
+Rate-limited, concurrent delivery of bot messages to many chats.
+
+Messages are queued and sent by a small pool of workers. All queues in the
+process share one global token bucket so combined traffic stays under
+Telegram's ~30 messages/second limit, and each chat is additionally limited
+to about one message per second. A RetryAfter only pauses the chat it was
+raised for; other chats keep flowing.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError, TelegramError
+
+LOGGER = logging.getLogger(__name__)
+
+# Stay a little under Telegram's documented 30 messages/second for bulk sends.
+GLOBAL_MESSAGES_PER_SECOND = 25
+# Telegram recommends no more than one message per second to the same chat.
+PER_CHAT_INTERVAL_SECONDS = 1.0
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """A simple asyncio token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Shared by every DeliveryQueue so reminders and broadcasts together respect the global limit.
+_global_bucket = TokenBucket(GLOBAL_MESSAGES_PER_SECOND)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    failed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.sent + self.failed
+
+
+@dataclass
+class _Delivery:
+    chat_id: int
+    send: Callable[..., Awaitable[Any]]
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+
+
+class DeliveryQueue:
+    """
+    Queues messages and sends them with a bounded worker pool.
+
+    Usage:
+        delivery = DeliveryQueue(name="reminders")
+        delivery.start()
+        delivery.submit(chat_id, context.bot.send_message, text="...")
+        ...
+        stats = await delivery.join()
+
+    `send` is any bot method that accepts `chat_id=` (send_message, send_photo,
+    forward_message, ...); it is called as `send(chat_id=chat_id, **kwargs)`.
+    `on_result(chat_id, success)` is called once per message when it is done.
+    """
+
+    def __init__(
+        self,
+        name: str = "delivery",
+        workers: int = DEFAULT_WORKERS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        per_chat_interval: float = PER_CHAT_INTERVAL_SECONDS,
+        on_result: Optional[Callable[[int, bool], Any]] = None,
+    ):
+        self.name = name
+        self._on_result = on_result
+        self.stats = DeliveryStats()
+        self._workers_count = max(1, workers)
+        self._max_attempts = max_attempts
+        self._per_chat_interval = per_chat_interval
+        self._queue: asyncio.Queue[_Delivery] = asyncio.Queue()
+        self._chat_ready_at: Dict[int, float] = {}
+        self._unfinished = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted messages that are not finished yet."""
+        return self._unfinished
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self._workers_count)
+        ]
+
+    def submit(self, chat_id: int, send: Callable[..., Awaitable[Any]], **kwargs) -> None:
+        """Queues one message. Never blocks; call start() before or after submitting."""
+        self._unfinished += 1
+        self._drained.clear()
+        self._queue.put_nowait(_Delivery(chat_id=chat_id, send=send, kwargs=kwargs))
+
+    async def join(self) -> DeliveryStats:
+        """Waits until every queued message was sent or given up on, then stops the workers."""
+        if self._unfinished and not self._workers:
+            self.start()
+        await self._drained.wait()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        return self.stats
+
+    async def stop(self) -> List[int]:
+        """
+        Stops the workers without waiting for the queue to drain.
+        Returns the chat ids of queued messages that were never attempted.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        unsent = []
+        while not self._queue.empty():
+            delivery = self._queue.get_nowait()
+            if delivery.attempts == 0:
+                unsent.append(delivery.chat_id)
+        return unsent
+
+    def _requeue_later(self, delivery: _Delivery, delay: float) -> None:
+        asyncio.get_running_loop().call_later(max(0.0, delay), self._queue.put_nowait, delivery)
+
+    def _finish(self, delivery: _Delivery, success: bool) -> None:
+        if success:
+            self.stats.sent += 1
+        else:
+            self.stats.failed += 1
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._drained.set()
+        if self._on_result is not None:
+            try:
+                self._on_result(delivery.chat_id, success)
+            except Exception as e:
+                LOGGER.error(f"[{self.name}] on_result callback failed for {delivery.chat_id}: {e}", exc_info=True)
+
+    async def _worker(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            try:
+                await self._process(delivery)
+            except Exception as e:
+                LOGGER.error(f"[{self.name}] Unexpected error while delivering to {delivery.chat_id}: {e}", exc_info=True)
+                self._finish(delivery, False)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, delivery: _Delivery) -> None:
+        # A paused chat does not hold up a worker; the message is re-queued for later.
+        wait = self._chat_ready_at.get(delivery.chat_id, 0.0) - time.monotonic()
+        if wait > 0:
+            self._requeue_later(delivery, wait)
+            return
+
+        # Reserve the chat's slot before waiting on the bucket so another worker cannot slip in.
+        self._chat_ready_at[delivery.chat_id] = time.monotonic() + self._per_chat_interval
+        await _global_bucket.acquire()
+        self._chat_ready_at[delivery.chat_id] = time.monotonic() + self._per_chat_interval
+        delivery.attempts += 1
+
+        try:
+            await delivery.send(chat_id=delivery.chat_id, **delivery.kwargs)
+            self._finish(delivery, True)
+        except RetryAfter as e:
+            pause = _retry_after_seconds(e)
+            self._chat_ready_at[delivery.chat_id] = time.monotonic() + pause
+            if delivery.attempts < self._max_attempts:
+                LOGGER.info(f"[{self.name}] Flood control for chat {delivery.chat_id}; pausing it for {pause:.0f}s.")
+                self._requeue_later(delivery, pause)
+            else:
+                LOGGER.warning(f"[{self.name}] Giving up on chat {delivery.chat_id} after repeated flood control.")
+                self._finish(delivery, False)
+        except BadRequest as e:
+            # BadRequest subclasses NetworkError, but a bad chat or malformed message never succeeds on retry.
+            LOGGER.warning(f"[{self.name}] Delivery to {delivery.chat_id} rejected: {e}")
+            self._finish(delivery, False)
+        except (TimedOut, NetworkError) as e:
+            if delivery.attempts < self._max_attempts:
+                self._requeue_later(delivery, delivery.attempts)
+            else:
+                LOGGER.warning(f"[{self.name}] Delivery to {delivery.chat_id} failed after {delivery.attempts} attempts: {e}")
+                self._finish(delivery, False)
+        except TelegramError as e:
+            LOGGER.warning(f"[{self.name}] Delivery to {delivery.chat_id} failed: {e}")
+            self._finish(delivery, False)
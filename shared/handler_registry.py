@@ -0,0 +1,145 @@
+# FILE: shared/handler_registry.py
+
+"""
+Registers every module's handlers exactly once and measures how they are used.
+
+register_modules() calls each module's register(application) a single time,
+then wraps every handler callback (including the ones nested in conversations)
+to count matches and time them. Handlers that are registered twice, or that
+can never run because an earlier handler in the same group has the same
+trigger, are reported at startup.
+"""
+
+import functools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+from telegram.ext import Application, BaseHandler, ConversationHandler
+
+LOGGER = logging.getLogger(__name__)
+
+_REGISTERED_MODULES_KEY = "_registered_handler_modules"
+
+
+@dataclass
+class HandlerStats:
+    """Match count and latency of one callback, summed over every handler that uses it."""
+    name: str
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_seconds * 1000 / self.count if self.count else 0.0
+
+
+_stats: Dict[str, HandlerStats] = {}
+
+
+def _callback_name(callback: Any) -> str:
+    callback = getattr(callback, "func", callback)  # functools.partial
+    return f"{getattr(callback, '__module__', '?')}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+def _trigger_of(handler: BaseHandler) -> Tuple[str, str]:
+    """What makes a handler match: its type plus its pattern, commands, filters or update type."""
+    for attribute in ("pattern", "commands", "filters", "type"):
+        value = getattr(handler, attribute, None)
+        if value is not None:
+            if attribute == "pattern" and hasattr(value, "pattern"):
+                value = value.pattern
+            elif attribute == "commands":
+                value = sorted(value)
+            return type(handler).__name__, f"{attribute}={value}"
+    return type(handler).__name__, "any"
+
+
+def _iter_handlers(handler: BaseHandler) -> Iterable[BaseHandler]:
+    """Yields the handler itself, or every handler nested in a conversation."""
+    if not isinstance(handler, ConversationHandler):
+        yield handler
+        return
+    nested = list(handler.entry_points) + list(handler.fallbacks)
+    for state_handlers in handler.states.values():
+        nested.extend(state_handlers)
+    for inner in nested:
+        yield from _iter_handlers(inner)
+
+
+def _instrument(handler: BaseHandler) -> None:
+    callback = handler.callback
+    if callback is None or getattr(callback, "_handler_stats", None) is not None:
+        return
+    full_name = _callback_name(callback)
+    stats = _stats.setdefault(full_name, HandlerStats(name=full_name.rsplit(".", 1)[-1]))
+
+    @functools.wraps(callback)
+    async def timed_callback(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.count += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    timed_callback._handler_stats = stats
+    handler.callback = timed_callback
+
+
+def _report_duplicates(application: Application) -> int:
+    """Logs handlers that repeat an earlier one. Returns how many were found."""
+    found = 0
+    seen_anywhere: Dict[Tuple[str, str, str], int] = {}
+    for group, handlers in sorted(application.handlers.items()):
+        seen_in_group: Dict[Tuple[str, str], str] = {}
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                continue
+            trigger = _trigger_of(handler)
+            name = _callback_name(handler.callback)
+            if (*trigger, name) in seen_anywhere:
+                found += 1
+                LOGGER.warning(f"Handler {name} ({trigger[1]}) is registered in group {seen_anywhere[(*trigger, name)]} and again in group {group}.")
+            elif trigger in seen_in_group and trigger[1] != "any":
+                found += 1
+                LOGGER.warning(f"Handler {name} ({trigger[1]}) in group {group} can never run: {seen_in_group[trigger]} matches first.")
+            seen_anywhere.setdefault((*trigger, name), group)
+            seen_in_group.setdefault(trigger, name)
+    return found
+
+
+def register_modules(application: Application, modules: Iterable[Any]) -> None:
+    """
+    Calls register(application) once per handler module, then instruments all
+    handlers and reports duplicates. Modules already registered are skipped.
+    """
+    registered = application.bot_data.setdefault(_REGISTERED_MODULES_KEY, set())
+    for module in modules:
+        if module.__name__ in registered:
+            LOGGER.warning(f"Handlers of '{module.__name__}' are already registered. Skipping.")
+            continue
+        module.register(application)
+        registered.add(module.__name__)
+
+    duplicates = _report_duplicates(application)
+    total = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            for inner in _iter_handlers(handler):
+                _instrument(inner)
+                total += 1
+    LOGGER.info(f"Registered {total} handlers from {len(registered)} modules ({duplicates} duplicates).")
+
+
+def get_handler_stats() -> List[HandlerStats]:
+    """Returns the statistics of every handler that ran at least once, slowest total first."""
+    return sorted((s for s in _stats.values() if s.count), key=lambda s: s.total_seconds, reverse=True)
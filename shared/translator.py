@@ -1,30 +1,92 @@
 # FILE: shared/translator.py (FINAL VERSION with Backward Compatibility)
 
+import asyncio
 import json
 import os
 import logging
+import string
 
 LOGGER = logging.getLogger(__name__)
 
+_MISSING = object()
+_FORMATTER = string.Formatter()
+
+
+class _CompiledTemplate:
+    """
+    A translation string parsed once at load time.
+
+    Templates that only use plain named fields ('{name}') are rewritten to
+    printf style ('%(name)s'), which renders the same text faster than
+    str.format. Anything else (format specs, conversions, attribute or index
+    access, positional fields) keeps using str.format.
+    """
+    __slots__ = ('template', 'names', 'percent_template')
+
+    def __init__(self, template):
+        self.template = template
+        parts = list(_FORMATTER.parse(template))
+        self.names = frozenset(name for _, name, _, _ in parts if name is not None)
+        simple = all(
+            name is None or (name.isidentifier() and not spec and not conversion)
+            for _, name, spec, conversion in parts
+        )
+        if simple:
+            self.percent_template = ''.join(
+                literal.replace('%', '%%') + (f'%({name})s' if name is not None else '')
+                for literal, name, _, _ in parts
+            )
+        else:
+            self.percent_template = None
+
+    def render(self, kwargs):
+        if self.percent_template is not None:
+            return self.percent_template % kwargs
+        return self.template.format(**kwargs)
+
+
+def _lang_dir(lang_code):
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'strings', lang_code)
+
+
+def _file_mtimes(lang_dir):
+    """Returns {file_name: mtime} for the language's .json files, or None if the directory is missing."""
+    try:
+        return {
+            f: os.stat(os.path.join(lang_dir, f)).st_mtime_ns
+            for f in os.listdir(lang_dir) if f.endswith('.json')
+        }
+    except OSError:
+        return None
+
+
 class Translator:
     def __init__(self):
         self._translations_cache = {}
-        self._is_reloading = False
+        # Every resolvable key (fully qualified and legacy) mapped straight to its value.
+        self._flat_index = {}
+        # Compiled templates for every string value in the index, by key.
+        self._templates = {}
+        # Keys already reported as missing; they are answered without logging or touching the disk.
+        self._missing_keys = set()
+        self._lang_code = "fa"
+        self._loaded_mtimes = None
+        self._observed_mtimes = None
 
-    def load_language(self, lang_code="fa"):
+    def _read_catalog(self, lang_code):
         """
-        Loads all .json language files from disk into the cache.
-        Each file is loaded under its own namespace (the filename).
+        Reads and indexes all .json files of a language. Does blocking file I/O and
+        touches no shared state, so it can run in a worker thread.
+        Returns (translations, flat_index, templates, mtimes), or None if the directory is missing.
         """
-        LOGGER.info(f"--- [Translator] Loading/Reloading language '{lang_code}' ---")
-        
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        lang_dir = os.path.join(project_root, 'strings', lang_code)
+        lang_dir = _lang_dir(lang_code)
         
         if not os.path.isdir(lang_dir):
             LOGGER.error(f"[Translator] FATAL: Language directory not found at: {lang_dir}")
-            return
+            return None
 
+        mtimes = _file_mtimes(lang_dir)
         new_translations = {}
         json_files = [f for f in os.listdir(lang_dir) if f.endswith('.json')]
 
@@ -37,74 +99,157 @@ class Translator:
                     new_translations[namespace] = data
             except Exception as e:
                 LOGGER.error(f"[Translator] Failed to load '{file_name}' into namespace '{namespace}': {e}")
-        
-        self._translations_cache = new_translations
-        total_keys = sum(len(v) for v in self._translations_cache.values() if isinstance(v, dict))
-        LOGGER.info(f"--- [Translator] Language '{lang_code}' loaded with {len(self._translations_cache)} namespaces and {total_keys} total keys. ---")
+
+        flat_index = self._build_flat_index(new_translations)
+        return new_translations, flat_index, self._compile_templates(flat_index), mtimes
+
+    def _install_catalog(self, lang_code, catalog):
+        translations, flat_index, templates, mtimes = catalog
+        # Plain attribute assignments: readers on the event loop see either the old or the new catalog.
+        self._translations_cache = translations
+        self._flat_index = flat_index
+        self._templates = templates
+        self._missing_keys = set()
+        self._lang_code = lang_code
+        self._loaded_mtimes = self._observed_mtimes = mtimes
+        total_keys = sum(len(v) for v in translations.values() if isinstance(v, dict))
+        LOGGER.info(f"--- [Translator] Language '{lang_code}' loaded with {len(translations)} namespaces and {total_keys} total keys. ---")
+
+    def load_language(self, lang_code="fa"):
+        """
+        Loads all .json language files from disk into the cache.
+        Each file is loaded under its own namespace (the filename).
+        Blocking; meant for startup. Use reload_if_changed() from running code.
+        """
+        LOGGER.info(f"--- [Translator] Loading/Reloading language '{lang_code}' ---")
+        catalog = self._read_catalog(lang_code)
+        if catalog is not None:
+            self._install_catalog(lang_code, catalog)
+
+    async def reload_if_changed(self, force=False):
+        """
+        Reloads the language files in a worker thread when they changed on disk.
+
+        Debounced: a change is only picked up once the files have stayed the same
+        for one whole check interval, so a half-written file is never loaded.
+        Returns True if a new catalog was installed.
+        """
+        lang_code = self._lang_code
+        mtimes = await asyncio.to_thread(_file_mtimes, _lang_dir(lang_code))
+        if not force:
+            if mtimes is None or mtimes == self._loaded_mtimes:
+                self._observed_mtimes = mtimes
+                return False
+            if mtimes != self._observed_mtimes:
+                self._observed_mtimes = mtimes
+                return False
+
+        LOGGER.info(f"--- [Translator] Language files for '{lang_code}' changed. Reloading in the background ---")
+        catalog = await asyncio.to_thread(self._read_catalog, lang_code)
+        if catalog is None:
+            return False
+        self._install_catalog(lang_code, catalog)
+        return True
+
+    @staticmethod
+    def _build_flat_index(translations):
+        """
+        Flattens the namespaces into one dict so a lookup is a single dict access.
+
+        Resolution order matches the original lookup rules:
+        1. Fully qualified keys ('namespace.section.key') always win.
+        2. Legacy keys ('section.key', i.e. the path inside a namespace) resolve to
+           the first namespace, in load order, that contains them. Legacy keys must
+           contain a dot, as before.
+        """
+        qualified = {}
+        legacy = {}
+        ambiguous = set()
+
+        def walk(node, path, namespace_path):
+            qualified['.'.join(path)] = node
+            if len(namespace_path) > 1:
+                legacy_key = '.'.join(namespace_path)
+                if legacy_key not in legacy:
+                    legacy[legacy_key] = node
+                elif legacy[legacy_key] != node:
+                    ambiguous.add(legacy_key)
+            if isinstance(node, dict):
+                for k, v in node.items():
+                    walk(v, path + [str(k)], namespace_path + [str(k)])
+
+        for namespace, data in translations.items():
+            qualified[namespace] = data
+            if isinstance(data, dict):
+                for k, v in data.items():
+                    walk(v, [namespace, str(k)], [str(k)])
+
+        # Only report leaves; differing parent sections are implied by them.
+        ambiguous_leaves = sorted(k for k in ambiguous if not isinstance(legacy[k], dict) and k not in qualified)
+        if ambiguous_leaves:
+            LOGGER.warning(
+                f"[Translator] {len(ambiguous_leaves)} legacy keys exist in more than one namespace with different text; "
+                f"the first namespace in load order wins. Examples: {', '.join(ambiguous_leaves[:5])}"
+            )
+
+        return {**legacy, **qualified}
+
+    @staticmethod
+    def _compile_templates(flat_index):
+        """Parses every string once. Malformed templates are reported here instead of at render time."""
+        compiled_by_text = {}
+        templates = {}
+        malformed = []
+        for key, value in flat_index.items():
+            if not isinstance(value, str):
+                continue
+            compiled = compiled_by_text.get(value)
+            if compiled is None:
+                try:
+                    compiled = _CompiledTemplate(value)
+                except ValueError:
+                    malformed.append(key)
+                    continue
+                compiled_by_text[value] = compiled
+            templates[key] = compiled
+        if malformed:
+            LOGGER.warning(
+                f"[Translator] {len(malformed)} strings are not valid format templates and can only be used "
+                f"without arguments. Examples: {', '.join(sorted(malformed)[:5])}"
+            )
+        return templates
 
     def get(self, key, **kwargs):
         """
         Retrieves a translation string with backward compatibility.
-        1. Tries the modern, namespaced key (e.g., 'marzban.marzban_display.title').
-        2. If not found, it tries a legacy, non-namespaced key by searching
-           through all top-level namespaces (e.g., 'marzban_display.title').
-        3. If still not found, it triggers a reload and tries both methods again.
+        Both modern, namespaced keys (e.g. 'marzban.marzban_display.title') and
+        legacy, non-namespaced keys (e.g. 'marzban_display.title') are resolved
+        with one lookup in the flat index built at load time.
+        Unknown keys are returned as-is and logged once; they are picked up by
+        the file watcher once they are added to the language files.
         """
-        # --- Attempt 1: Try the modern, fully qualified key first ---
-        try:
-            return self._get_from_dict(self._translations_cache, key, **kwargs)
-        except KeyError:
-            pass  # Key not found, proceed to legacy check
-
-        # --- Attempt 2: Try legacy (non-namespaced) key ---
-        if '.' in key:
-            try:
-                for namespace in self._translations_cache.values():
-                    if isinstance(namespace, dict):
-                        try:
-                            return self._get_from_dict(namespace, key, **kwargs)
-                        except KeyError:
-                            continue # Not in this namespace, try next
-            except (KeyError, TypeError):
-                 pass
-
-        # --- If both attempts fail, trigger a reload and try everything again ---
-        if not self._is_reloading:
-            LOGGER.warning(f"[Translator] Key '{key}' not found. Triggering automatic reload.")
-            self._is_reloading = True
-            self.load_language("fa")
-            self._is_reloading = False
-            
-            # --- Attempt 3: Retry modern key after reload ---
-            try:
-                return self._get_from_dict(self._translations_cache, key, **kwargs)
-            except KeyError:
-                pass
+        value = self._flat_index.get(key, _MISSING)
+
+        if value is _MISSING:
+            if key not in self._missing_keys:
+                self._missing_keys.add(key)
+                LOGGER.error(f"[Translator] Key '{key}' not found.")
+            return key
 
-            # --- Attempt 4: Retry legacy key after reload ---
-            if '.' in key:
-                try:
-                    for namespace in self._translations_cache.values():
-                        if isinstance(namespace, dict):
-                            try:
-                                return self._get_from_dict(namespace, key, **kwargs)
-                            except KeyError:
-                                continue
-                except (KeyError, TypeError):
-                    pass
-        
-        LOGGER.error(f"[Translator] Key '{key}' not found even after reload and legacy check.")
-        return key
-
-    def _get_from_dict(self, dictionary, key, **kwargs):
-        """Helper function to navigate the dictionary."""
-        keys = key.split('.')
-        value = dictionary
-        for k in keys:
-            value = value[k]
-        
         if kwargs:
-            return value.format(**kwargs)
+            compiled = self._templates.get(key)
+            if compiled is None:
+                LOGGER.error(f"[Translator] Key '{key}' is not a valid template and cannot be formatted.")
+                return key
+            try:
+                return compiled.render(kwargs)
+            except (KeyError, IndexError, AttributeError) as e:
+                missing = sorted(compiled.names - kwargs.keys())
+                if missing:
+                    LOGGER.error(f"[Translator] Missing placeholders {missing} for key '{key}'.")
+                else:
+                    LOGGER.error(f"[Translator] Could not format key '{key}': invalid placeholder {e}.")
+                return key
         return value
 
 # --- SINGLETON INSTANCE AND ALIAS ---
@@ -115,4 +260,8 @@ _ = translator.get
 
 def init_translator():
     """Initializes the translator at startup."""
-    translator.load_language("fa")
\ No newline at end of file
+    translator.load_language("fa")
+
+async def watch_translations_job(context) -> None:
+    """Repeating job: hot-reloads the language files after they were edited on disk."""
+    await translator.reload_if_changed()
@@ -0,0 +1,111 @@
+# FILE: shared/update_trace.py
+
+"""
+Sampled, structured trace of incoming updates.
+
+When enabled from the bot settings menu, a sample of updates (see
+config.UPDATE_TRACE_SAMPLE_RATE) is written to update_trace.log as one JSON
+object per line. The handler only builds a small dict; formatting and file
+writes happen on a QueueListener thread, so tracing never blocks the event loop.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import config
+
+LOGGER = logging.getLogger(__name__)
+
+TRACE_LOG_FILE = "update_trace.log"
+SETTING_KEY = "is_update_trace_active"
+_TEXT_PREVIEW_CHARS = 64
+
+_trace_logger = logging.getLogger("update_trace")
+_listener: Optional[logging.handlers.QueueListener] = None
+# Mirrors the bot setting so the per-update check does not touch the settings cache.
+_enabled = False
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(getattr(record, "trace", {"message": record.getMessage()}), ensure_ascii=False)
+
+
+def start_update_trace() -> None:
+    """Attaches the queue handler and starts the writer thread. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    file_handler = logging.handlers.RotatingFileHandler(TRACE_LOG_FILE, maxBytes=5*1024*1024, backupCount=3, encoding='utf-8')
+    file_handler.setFormatter(_JsonLineFormatter())
+    trace_queue: queue.Queue = queue.Queue(-1)
+    _trace_logger.addHandler(logging.handlers.QueueHandler(trace_queue))
+    _trace_logger.setLevel(logging.INFO)
+    # Keep traces out of bot.log and the console.
+    _trace_logger.propagate = False
+    _listener = logging.handlers.QueueListener(trace_queue, file_handler)
+    _listener.start()
+
+
+def stop_update_trace() -> None:
+    """Flushes queued traces and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def is_trace_enabled() -> bool:
+    return _enabled
+
+
+def set_trace_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = bool(enabled)
+    LOGGER.info(f"Update trace {'enabled' if _enabled else 'disabled'} (sample rate {config.UPDATE_TRACE_SAMPLE_RATE}).")
+
+
+async def load_trace_setting() -> None:
+    """Reads the persisted toggle from the bot settings."""
+    from database.crud import bot_setting as crud_bot_setting
+    settings = await crud_bot_setting.load_bot_settings()
+    set_trace_enabled(settings.get(SETTING_KEY, False))
+
+
+async def trace_update(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not _enabled or random.random() >= config.UPDATE_TRACE_SAMPLE_RATE:
+        return
+    if not isinstance(update, Update):
+        return
+
+    trace = {
+        "ts": round(time.time(), 3),
+        "update_id": update.update_id,
+        "user_id": update.effective_user.id if update.effective_user else None,
+        "chat_id": update.effective_chat.id if update.effective_chat else None,
+    }
+    if update.callback_query:
+        trace["kind"] = "callback"
+        trace["data"] = update.callback_query.data
+    elif update.message:
+        trace["kind"] = "command" if (update.message.text or "").startswith("/") else "message"
+        if update.message.text:
+            trace["text_len"] = len(update.message.text)
+            trace["text"] = update.message.text[:_TEXT_PREVIEW_CHARS]
+        else:
+            trace["content"] = next(
+                (attr for attr in ("photo", "document", "video", "voice", "sticker", "contact") if getattr(update.message, attr, None)),
+                "other"
+            )
+    else:
+        trace["kind"] = "other"
+
+    _trace_logger.info("update", extra={"trace": trace})